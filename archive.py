@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# archive.py
+# 20261018
+
+"""
+Keep every response downloaded from Yahoo in a compressed, append-only
+archive partitioned by date, and rebuild hl.db from it without the network.
+
+Layout: archive/YYYY-MM-DD/responses.gz holds one gzip member per response,
+appended in the order fetched; archive/YYYY-MM-DD/index.tsv has one line per
+response: kind, key, url, offset and length of its member.
+
+Replay all partitions (or only those named) into hl.db with
+    python archive.py replay [YYYY-MM-DD ...]
+"""
+
+import concurrent.futures as CF
+import datetime as D
+import gzip
+import os
+import sqlite3 as SQ
+import sys
+import threading
+from array import array
+
+ARCHIVE_DIR = 'archive'
+RESPONSES = 'responses.gz'
+INDEX = 'index.tsv'
+# Kinds of response.
+QUOTES = 'quotes'
+PAGE = 'page'
+
+class Archive():
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        self.lock = threading.Lock()
+
+    def store(self, kind, key, url, body, day=None):
+        """
+        In:  kind of response (QUOTES or PAGE), key (symbol for a page,
+                 ticker string for quotes), url, body (bytes),
+                 optional date of partition, by default today.
+        Out: Appends body to the partition and records it in the index.
+        """
+        if day is None:
+            day = D.date.today()
+        partition = os.path.join(self.root, day.isoformat())
+        member = gzip.compress(body)
+        with self.lock:
+            os.makedirs(partition, exist_ok=True)
+            with open(os.path.join(partition, RESPONSES), 'ab') as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(member)
+            with open(os.path.join(partition, INDEX), 'a') as f:
+                f.write('\t'.join([kind, key, url, str(offset),
+                        str(len(member))]) + '\n')
+
+    def partitions(self):
+        """Out: sorted list of dates (as strings) of existing partitions."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                if os.path.isfile(os.path.join(self.root, name, INDEX)))
+
+    def entries(self, day, kind=None, shard=None):
+        """
+        In:  date of partition (string), optional kind of response wanted,
+                 optional (number, count) of shard: only every count-th
+                 entry wanted, starting from the number-th.
+        Out: generator of (kind, key, url, body) in the order stored.
+        """
+        partition = os.path.join(self.root, day)
+        wanted = 0
+        with open(os.path.join(partition, INDEX), 'r') as index, \
+                open(os.path.join(partition, RESPONSES), 'rb') as responses:
+            for line in index:
+                entry_kind, key, url, offset, length = \
+                        line.rstrip('\n').split('\t')
+                if kind is not None and entry_kind != kind:
+                    continue
+                wanted += 1
+                if shard is not None and (wanted - 1) % shard[1] != shard[0]:
+                    continue
+                responses.seek(int(offset))
+                body = gzip.decompress(responses.read(int(length)))
+                yield entry_kind, key, url, body
+
+def replay_partition(root, day):
+    """
+    In:  archive root, date of partition (string).
+    Out: date of partition, list of headline rows, list of Quotes and
+             tuple of their percent changes and mask, as StockScraper would
+             have produced them that day.
+    """
+    # Imported here, since this runs in worker processes.
+    from headline_to_db import StockScraper
+    scraper = StockScraper(False, None)
+    today = D.date(*(int(part) for part in day.split('-')))
+    rows = []
+    for kind, symbol, url, body in Archive(root).entries(day, PAGE):
+        webpage = scraper.retrieve_webpage_from(body)
+        for headline, link, source, newsdate in scraper.process_webpage(
+                webpage, today):
+            news_date_str = scraper.convert_news_date(newsdate, today)
+            if news_date_str is None:
+                continue
+            rows.append((symbol, headline, link, source, news_date_str,
+                    today))
+    quotes = []
+    percent, valid = array('d'), bytearray()
+    for kind, tickers, url, body in Archive(root).entries(day, QUOTES):
+        batch = [row_dict
+                for row_dict in scraper.parse_quotes(body.decode().strip())
+                if 'Change' in row_dict and 'Last trade' in row_dict]
+        batch_percent, batch_valid = scraper.percent_batch(batch)
+        quotes.extend(batch)
+        percent.extend(batch_percent)
+        valid.extend(batch_valid)
+    return day, rows, quotes, (percent, valid)
+
+def replay(root=ARCHIVE_DIR, days=None, db='hl.db', workers=None):
+    """
+    In:  archive root, optional list of partitions (default all), db path,
+             optional number of worker processes.
+    Out: Rebuilds headlines and prices in db from the archive; returns
+             number of headlines added.
+    """
+    from headline_to_db import StockScraper, migrate_db
+    # Oldest first, as they were stored, whatever order they were named in.
+    days = sorted(days or Archive(root).partitions())
+    scraper = StockScraper(False, None)
+    added = 0
+    with SQ.connect(db) as connection:
+        migrate_db(connection)
+        # Everything written here can be rebuilt from the archive again.
+        connection.execute('PRAGMA synchronous = OFF')
+        # Partitions are parsed in parallel; rows are inserted here, by one
+        #     writer, a partition per transaction, in date order whatever
+        #     order they are parsed in, so that ids (and so report order)
+        #     and the lookupdate kept for a repeated headline are those of
+        #     the original db.
+        with CF.ProcessPoolExecutor(workers) as executor:
+            for day, rows, quotes, columns in executor.map(replay_partition,
+                    [root] * len(days), days):
+                count = scraper.insert_headlines(connection, rows)
+                prices = scraper.store_prices(connection, quotes,
+                        D.date(*(int(part) for part in day.split('-'))),
+                        columns)
+                print('{0}: {1} headlines, {2} added; {3} prices added.'.
+                        format(day, len(rows), count, prices))
+                added += count
+    return added
+
+def main(args):
+    if args[:1] == ['replay']:
+        added = replay(days=args[1:])
+        print('\n{0} headlines added in all.'.format(added))
+    elif args[:1] == ['list']:
+        print('\n'.join(Archive().partitions()))
+    else:
+        print(__doc__)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# bench_http.py
+# 20261018
+
+"""
+Per-request latency against a local stand-in server: a fresh connection per
+request with urllib.request.urlopen, and pooled keep-alive connections with
+http_client.
+
+Run from the main directory as
+    python benchmarks/bench_http.py [number of requests]
+"""
+
+import os
+import sys
+import time as T
+import urllib.request as UR
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_client
+import fixtures
+
+def latency(label, count, urlopen, urls):
+    start = T.perf_counter()
+    for url in urls[:count]:
+        urlopen(url).read()
+    elapsed = T.perf_counter() - start
+    print('{0:24s} {1:8.1f} us/request'.format(label, elapsed * 1e6 / count))
+
+def main(count=2000):
+    server = fixtures.StandInServer()
+    # Small responses, so that connection set-up dominates.
+    urls = [server.quote_url.format(symbol, 's')
+            for symbol in fixtures.symbols(count)]
+    try:
+        latency('urllib, new connection', count, UR.urlopen, urls)
+        client = http_client.HTTPClient()
+        latency('http_client, keep-alive', count, client.urlopen, urls)
+        print('connections opened by http_client:', client.connections_opened)
+        client.close()
+    finally:
+        server.close()
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
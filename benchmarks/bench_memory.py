@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# bench_memory.py
+# 20261018
+
+"""
+Peak memory (tracemalloc) and time for holding quotes and headlines: the
+per-ticker dictionaries and per-headline lists used before, against Quotes
+and Headlines from records.py.
+
+Run from the main directory as
+    python benchmarks/bench_memory.py [number of tickers] [headlines per page]
+"""
+
+import gc
+import os
+import sys
+import time as T
+import tracemalloc
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import headline_to_db
+import news_parser
+import records
+import fixtures
+
+def dict_quotes(tag_names, retrieved_contents):
+    """Parse as lookup did before records.py: a dictionary per ticker."""
+    full_data = []
+    for item in retrieved_contents.split('\n'):
+        one_row = item.split(',')
+        full_data.append({list_item: row_item.strip('"')
+                for list_item, row_item in zip(tag_names, one_row)})
+    return full_data
+
+def measure(label, function):
+    """Report peak memory and time taken by function; return its result."""
+    gc.collect()
+    tracemalloc.start()
+    start = T.perf_counter()
+    result = function()
+    elapsed = T.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print('{0:32s} {1:9.2f} MiB {2:8.3f} s'.format(label, peak / 2**20,
+            elapsed))
+    return result
+
+def main(count=7567, per_page=20):
+    warnings.simplefilter('ignore')
+    tag_names = headline_to_db.StockScraper(False, None).tag_names
+    symbols = fixtures.symbols(count)
+    csv = fixtures.quotes_csv(symbols).decode()
+    print('{0} quotes:'.format(count))
+    before = measure('dictionaries',
+            lambda: dict_quotes(tag_names, csv))
+    after = measure('Quotes',
+            lambda: headline_to_db.StockScraper(False, None).parse_quotes(csv))
+    assert before == after
+    del before, after
+    # Parsing pages takes far longer than holding what they yield, so a few
+    #     pages are parsed and their text reused for every ticker.
+    pages = [news_parser.parse_page(fixtures.headline_page(symbol, per_page))
+            for symbol in symbols[:20]]
+    fields = [[str(field) for field in headline] for page in pages
+            for headline in page]
+    total = count * per_page
+    print('{0} headlines:'.format(total))
+    before = measure('lists',
+            lambda: [[headline, link, source, date] for i in range(count)
+            for headline, link, source, date in fields[:per_page]])
+    after = measure('Headlines',
+            lambda: [records.Headline(headline, link, source, date)
+            for i in range(count)
+            for headline, link, source, date in fields[:per_page]])
+    assert before == [list(headline) for headline in after]
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# bench_parse.py
+# 20261018
+
+"""
+Pages per second for parsing headline pages: the original full-tree parse,
+the <li>-only parse in news_parser, and the latter in a process pool.
+
+Run from the main directory as
+    python benchmarks/bench_parse.py [number of pages]
+"""
+
+import concurrent.futures as CF
+import os
+import re
+import sys
+import time as T
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bs4
+import news_parser
+import fixtures
+
+def original_parse(retrieved_contents):
+    """Parse as process_webpage did before news_parser: whole tree."""
+    webpage = bs4.BeautifulSoup(retrieved_contents)
+    headline_list = []
+    for item in webpage.find_all('li'):
+        try:
+            headline = item.a.text
+            link = re.sub('http.+?\*', '', item.a.attrs['href'])
+            source = str(item.cite).replace('\xa0'+str(item.span), '')
+            if source == 'None':
+                continue
+            source = re.sub('<\/?cite>', '', source)
+            source = re.sub('^at ', '', source)
+            newsdate = re.sub('\(|\)', '', item.span.text)
+            if newsdate.count('AM') or newsdate.count('PM'):
+                newsdate = T.strftime('%a, %b %d', T.localtime())
+            headline_list.append([headline, link, source, newsdate])
+        except Exception as e:
+            continue
+    return headline_list
+
+def rate(label, pages, function):
+    start = T.perf_counter()
+    results = function(pages)
+    elapsed = T.perf_counter() - start
+    print('{0:28s} {1:8.1f} pages/s'.format(label, len(pages) / elapsed))
+    return results
+
+def main(count=500, workers=os.cpu_count()):
+    warnings.simplefilter('ignore')
+    pages = [fixtures.headline_page(symbol)
+            for symbol in fixtures.symbols(count)]
+    before = rate('full tree', pages,
+            lambda pages: [original_parse(page) for page in pages])
+    after = rate('<li> only', pages,
+            lambda pages: [news_parser.parse_page(page) for page in pages])
+    with CF.ProcessPoolExecutor(workers) as executor:
+        pooled = rate('<li> only, {0} processes'.format(workers), pages,
+                lambda pages: list(executor.map(news_parser.parse_page, pages,
+                chunksize=16)))
+    # Headlines are tuples now; the original parse made lists.
+    after = [[list(headline) for headline in page] for page in after]
+    pooled = [[list(headline) for headline in page] for page in pooled]
+    assert before == after == pooled
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
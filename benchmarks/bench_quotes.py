@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# bench_quotes.py
+# 20261018
+
+"""
+Quotes per second for percent change: format_data on one dictionary at a
+time against format_batch on the whole response, for both headline_to_db
+and db_to_latex. The results are checked to be identical.
+
+Run from the main directory as
+    python benchmarks/bench_quotes.py [number of tickers]
+"""
+
+import contextlib
+import copy
+import io
+import os
+import sys
+import time as T
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db_to_latex
+import headline_to_db
+import fixtures
+
+# Rows the per-row code treats specially: both zero, no base, tiny changes.
+EDGE_ROWS = [
+        '"Z0","1/2/2015",0.00,0.00,N/A,"N/A","N/A"',
+        '"Z1","1/2/2015",0,-0.00,N/A,"N/A","N/A"',
+        '"Z2","1/2/2015",0.00001,0.00000,N/A,"N/A","N/A"',
+        '"Z3","1/2/2015",100.00,-0.001,N/A,"N/A","N/A"',
+        '"Z4","1/2/2015",N/A,N/A,N/A,"N/A","N/A"']
+
+def rate(label, rows, function, repeat):
+    """
+    Time function on fresh copies of rows, silencing its prints; report the
+    best of repeat runs.
+    """
+    best = None
+    for i in range(repeat):
+        copied = copy.deepcopy(rows)
+        start = T.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = function(copied)
+        elapsed = T.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print('{0:28s} {1:10.0f} quotes/s'.format(label, len(rows) / best))
+    return results
+
+def main(count=7567, repeat=20):
+    scraper = headline_to_db.StockScraper(False, None)
+    csv = fixtures.quotes_csv(fixtures.symbols(count)).decode()
+    rows = scraper.parse_quotes('\n'.join([csv] + EDGE_ROWS))
+    # The no-base rows end db_to_latex.format_data with ZeroDivisionError.
+    report_rows = [row for row in rows
+            if 'N/A' in (row['Change'], row['Last trade']) or
+            float(row['Last trade']) != float(row['Change'])]
+    print('{0} quotes, best of {1}:'.format(len(rows), repeat))
+    before = rate('headline_to_db, per row', rows,
+            lambda rows: [scraper.format_data(row) for row in rows], repeat)
+    after = rate('headline_to_db, batch', rows, scraper.format_batch, repeat)
+    assert before == after
+    before = rate('db_to_latex, per row', report_rows,
+            lambda rows: [db_to_latex.format_data(row) for row in rows],
+            repeat)
+    after = rate('db_to_latex, batch', report_rows, db_to_latex.format_batch,
+            repeat)
+    assert before == after
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
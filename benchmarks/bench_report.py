@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# bench_report.py
+# 20261018
+
+"""
+Time db_to_latex.process_news on a synthetic hl.db in which most tickers
+are quiet (old news only), to confirm report time is linear in its size.
+
+Run from the main directory as
+    python benchmarks/bench_report.py
+"""
+
+import io
+import os
+import sys
+import tempfile
+import time as T
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db_to_latex
+import fixtures
+
+def main(sizes=(1000, 2000, 4000, 8000), days_of_history=7):
+    here = os.getcwd()
+    for tickers in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                # Five headlines per ticker, from the last five days; most
+                #     tickers' are two months older (quiet).
+                symbols = fixtures.make_db('hl.db', tickers * 5, per_ticker=5,
+                        days=5, quiet_fraction=0.9)
+                tex_file = io.StringIO()
+                start = T.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    db_to_latex.process_news(symbols, tex_file, days_of_history)
+                elapsed = T.perf_counter() - start
+            finally:
+                os.chdir(here)
+        print('{0:6d} tickers: {1:8.3f} s, {2:8.1f} us/ticker, {3} bytes'.
+                format(tickers, elapsed, elapsed * 1e6 / tickers,
+                len(tex_file.getvalue())))
+
+if __name__ == '__main__':
+    main()
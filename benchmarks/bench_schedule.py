@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# bench_schedule.py
+# 20261018
+
+"""
+Simulate a month of runs over the full ticker universe, fetching every
+ticker every run versus only those scheduler.py says are due, and count
+requests made and headlines missed (pushed off the page between fetches).
+
+Run from the main directory as
+    python benchmarks/bench_schedule.py [runs per day]
+"""
+
+import os
+import random
+import sqlite3 as SQ
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scheduler
+import fixtures
+
+# Yahoo showed about this many of the latest headlines on a page.
+PAGE_HEADLINES = 20
+TICKERS = 7567
+DAYS = 30
+
+def news_rates(rng, count):
+    """New headlines per day for each ticker: a few busy, most dormant."""
+    rates = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.05:
+            rates.append(rng.uniform(2, 10))
+        elif kind < 0.20:
+            rates.append(rng.uniform(0.2, 1))
+        else:
+            rates.append(rng.uniform(0, 0.02))
+    return rates
+
+def simulate(symbols, rates, runs_per_day, use_schedule, seed=1):
+    rng = random.Random(seed)
+    connection = SQ.connect(':memory:')
+    connection.execute('''CREATE TABLE refresh(ticker VARCHAR(5) PRIMARY KEY,
+            last_fetch FLOAT, last_new_headline FLOAT, news_velocity FLOAT)''')
+    pending = dict.fromkeys(symbols, 0)
+    requests = missed = found = 0
+    step = scheduler.DAY / runs_per_day
+    for run in range(DAYS * runs_per_day):
+        now = run * step
+        # News arrives between runs.
+        for symbol, rate in zip(symbols, rates):
+            expected = rate / runs_per_day
+            pending[symbol] += int(expected) + (rng.random() < expected % 1)
+        if use_schedule:
+            due = scheduler.due_symbols(connection, symbols, now=now)
+        else:
+            due = symbols
+        added = {}
+        # Each page shows the latest PAGE_HEADLINES of a long history.
+        pages = {symbol: (PAGE_HEADLINES, now - PAGE_HEADLINES / rate *
+                scheduler.DAY) for symbol, rate in zip(symbols, rates) if rate}
+        for symbol in due:
+            requests += 1
+            found += min(pending[symbol], PAGE_HEADLINES)
+            missed += max(0, pending[symbol] - PAGE_HEADLINES)
+            added[symbol] = min(pending[symbol], PAGE_HEADLINES)
+            pending[symbol] = 0
+        if use_schedule:
+            scheduler.record_fetches(connection, due, added, now=now,
+                    pages=pages)
+    return requests, found, missed
+
+def main(runs_per_day=4):
+    symbols = fixtures.symbols(TICKERS)
+    rates = news_rates(random.Random(0), TICKERS)
+    for label, use_schedule in (('every ticker, every run', False),
+            ('scheduled', True)):
+        requests, found, missed = simulate(symbols, rates, runs_per_day,
+                use_schedule)
+        print('{0:24s} {1:9d} requests {2:8d} headlines {3:6d} missed'.format(
+                label, requests, found, missed))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
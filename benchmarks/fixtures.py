@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# fixtures.py
+# 20261018
+
+"""Synthetic data for the benchmarks, shaped like what Yahoo used to send."""
+
+import datetime
+import hashlib
+import os
+import random
+import sqlite3
+
+PAGE_START = ('<html><head><title>{0} Headlines | Yahoo! Finance</title>'
+        '<script type="text/javascript">var YAHOO = {{}};</script>'
+        '</head><body>{2}<div id="yfncsumtab"><ul class="nav">{1}</ul>'
+        '<div class="mod yfi_quote_headline"><ul class="newsheadlines">')
+PAGE_END = '</ul></div></div><div id="footer"><ul>{0}</ul></div></body></html>'
+# The rest of the page: quote summary tables, ads and so on.
+FILLER_BLOCK = ('<div class="yfi_rt_quote_summary"><table><tr><th>Prev Close:'
+        '</th><td class="yfnc_tabledata1">{0}.{1:02d}</td></tr><tr><th>Open:'
+        '</th><td class="yfnc_tabledata1">{1}.{0:02d}</td></tr></table>'
+        '<p class="ad"><span><b>Advertisement</b> <i>{0}</i></span></p></div>')
+NAV_ITEM = '<li><a href="/q/{0}?s={1}">{0}</a></li>'
+HEADLINE_ITEM = ('<li><a href="http://us.rd.yahoo.com/finance/news/rss/story/'
+        '*http://www.example.com/news/{0}/{1}.html">{2}</a>'
+        '<cite>at {3}\xa0<span>({4})</span></cite></li>')
+SOURCES = ['Reuters', 'AP', 'Motley Fool', 'Bloomberg', 'MarketWatch',
+        'Business Wire', 'Zacks', 'TheStreet.com']
+WORDS = ['shares', 'rise', 'fall', 'after', 'earnings', 'dividend', 'cut',
+        'acquisition', 'beats', 'misses', '&amp;', 'Q3', '$1.2B', '5%',
+        'outlook', 'analyst', 'upgrade', 'downgrade', '"record"', 'merger']
+DAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri']
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep',
+        'Oct', 'Nov', 'Dec']
+# Every response of StandInServer is as old as this.
+LAST_MODIFIED = 'Fri, 13 Mar 2015 16:00:00 GMT'
+
+def symbols(count):
+    """List of count distinct synthetic ticker symbols."""
+    return ['S{0:04d}'.format(i) for i in range(count)]
+
+def headline_text(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 14)))
+
+def headline_page(symbol, headlines=20, nav_items=40, filler=60, seed=None):
+    """
+    In:  symbol, number of headlines, of other <li> elements and of other
+             blocks of markup on the page.
+    Out: page (bytes) in the layout that process_webpage expects.
+    """
+    rng = random.Random(symbol if seed is None else seed)
+    nav = ''.join(NAV_ITEM.format(name, symbol) for name in
+            ('Summary', 'Chart', 'News', 'Profile', 'Options', 'Holders')
+            * (nav_items // 12))
+    items = []
+    for i in range(headlines):
+        if i % 7 == 6:
+            date = '{0}:{1:02d}AM EDT'.format(rng.randint(1, 11),
+                    rng.randint(0, 59))
+        else:
+            date = '{0}, {1} {2}'.format(rng.choice(DAYS), rng.choice(MONTHS),
+                    rng.randint(1, 28))
+        items.append(HEADLINE_ITEM.format(symbol, i, headline_text(rng),
+                rng.choice(SOURCES), date))
+    blocks = ''.join(FILLER_BLOCK.format(rng.randint(1, 99), i % 100)
+            for i in range(filler))
+    page = (PAGE_START.format(symbol, nav, blocks) + ''.join(items) +
+            PAGE_END.format(nav))
+    return page.encode()
+
+def quotes_csv(tickers, seed=0):
+    """
+    In:  list of symbols.
+    Out: quote response (bytes) for them, as from quotes.csv?f=sd1l1c1dr1q.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for symbol in tickers:
+        last = rng.choice(['N/A', '0.00'] + ['{0:.2f}'.format(
+                rng.uniform(1, 500)) for _ in range(18)])
+        change = rng.choice(['N/A', '0.00'] + ['{0:+.2f}'.format(
+                rng.uniform(-9, 9)) for _ in range(18)])
+        rows.append('"{0}","{1}/{2}/2015",{3},{4},{5},"{6}","{7}"'.format(
+                symbol, rng.randint(1, 12), rng.randint(1, 28), last, change,
+                rng.choice(['N/A', '0.52', '1.10']),
+                rng.choice(['N/A', 'Mar 20']), rng.choice(['N/A', 'Mar 10'])))
+    return '\n'.join(rows).encode()
+
+def make_db(path, headlines, per_ticker=50, days=90, seed=0,
+        quiet_fraction=0.0, quiet_days=60):
+    """
+    In:  path of db to create, number of headlines, headlines per ticker,
+             number of days back (from today) their dates are spread over;
+             fraction of tickers (the first ones) that are quiet, with
+             every date quiet_days further back.
+    Out: list of symbols; db has the create_table.sqlscript schema and the
+             headlines, each ticker's in order of date.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, 'create_table.sqlscript'), 'r') as f:
+        schema = f.read()
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    dates = [(today - datetime.timedelta(i)).isoformat()
+            for i in range(days + quiet_days)]
+    tickers = symbols(max(1, headlines // per_ticker))
+    def rows():
+        for n, symbol in enumerate(tickers):
+            # The last ticker takes whatever is left over.
+            count = (per_ticker if n < len(tickers) - 1 else
+                    headlines - n * per_ticker)
+            offset = quiet_days if n < len(tickers) * quiet_fraction else 0
+            back = sorted((offset + rng.randrange(days)
+                    for _ in range(count)), reverse=True)
+            for i in range(count):
+                # Numbered, as the db keeps each headline once per ticker.
+                yield (symbol, '{0} ({1})'.format(
+                        headline_text(rng).replace('&amp;', '&'), i),
+                        'http://www.example.com/news/{0}/{1}.html'.format(
+                        symbol, i), rng.choice(SOURCES), dates[back[i]],
+                        today.isoformat())
+    connection = sqlite3.connect(path)
+    try:
+        connection.executescript(schema)
+        # Nothing here is worth a journal; the db can be made again.
+        connection.execute('PRAGMA journal_mode = OFF')
+        connection.execute('PRAGMA synchronous = OFF')
+        with connection:
+            connection.executemany('''INSERT INTO headlines (ticker, headline,
+                    url, source, date, lookupdate) VALUES (?, ?, ?, ?, ?, ?)''',
+                    rows())
+    finally:
+        connection.close()
+    return tickers
+
+class StandInServer():
+    """
+    Local HTTP/1.1 server standing in for finance.yahoo.com: answers
+    /q/h?s=SYMBOL with headline_page and /d/quotes.csv?s=A+B with quotes_csv.
+    Can add latency and fail a fraction of requests (503), or a given
+    number of requests in a row, to exercise retry and backoff. Responses
+    carry ETag and Last-Modified; a request whose If-None-Match or
+    If-Modified-Since still holds gets 304 Not Modified.
+    """
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        import http.server
+        import threading
+        import urllib.parse
+        self.latency = latency
+        self.error_rate = error_rate
+        self.fail_next = 0
+        self.requests = 0
+        self.errors = 0
+        self.not_modified = 0
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        stand_in = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; without this,
+            #     Nagle's algorithm stalls every keep-alive response.
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                import time
+                with stand_in.lock:
+                    stand_in.requests += 1
+                    fail = stand_in.fail_next > 0 or (
+                            stand_in.rng.random() < stand_in.error_rate)
+                    if stand_in.fail_next > 0:
+                        stand_in.fail_next -= 1
+                    if fail:
+                        stand_in.errors += 1
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+                if fail:
+                    self.send_response(503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                parts = urllib.parse.urlsplit(self.path)
+                query = urllib.parse.parse_qs(parts.query)
+                symbols = query.get('s', [''])[0].replace(' ', '+').split('+')
+                if parts.path.endswith('quotes.csv'):
+                    body = quotes_csv(symbols)
+                else:
+                    body = headline_page(symbols[0])
+                etag = '"{0}"'.format(hashlib.sha1(body).hexdigest())
+                if (self.headers.get('If-None-Match') == etag or
+                        self.headers.get('If-Modified-Since') ==
+                        LAST_MODIFIED and 'If-None-Match' not in self.headers):
+                    with stand_in.lock:
+                        stand_in.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', LAST_MODIFIED)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                daemon=True)
+        self.thread.start()
+        self.base = 'http://127.0.0.1:{0}'.format(self.server.server_address[1])
+        self.news_url = self.base + '/q/h?s={0}&t={1}'
+        self.quote_url = self.base + '/d/quotes.csv?s={0}&f={1}'
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# suite.py
+# 20261018
+
+"""
+Time every hot path on synthetic data and write the results as JSON, so
+that runs on different versions can be compared.
+
+Run from the main directory as
+    python benchmarks/suite.py [--large] [--output results.json]
+    python benchmarks/suite.py compare old.json new.json
+
+--large adds the 1M and 5M headline databases, which take minutes to build.
+"""
+
+import contextlib
+import copy
+import datetime as D
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3 as SQ
+import statistics
+import subprocess
+import sys
+import tempfile
+import time as T
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import db_to_latex
+import fragment_cache
+import headline_to_db
+import latex_escape
+import news_parser
+import fixtures
+
+QUOTE_SIZES = (200, 7567)
+PAGE_COUNT = 100
+HEADLINE_COUNT = 20000
+INGEST_TICKERS = 200
+DB_SIZES = (10000, 100000)
+LARGE_DB_SIZES = (1000000, 5000000)
+REPORT_DAYS = 7
+
+def timed(name, size, function, setup=None, repeat=5):
+    """
+    In:  benchmark name, number of items handled per call, function to time,
+             optional setup function whose result is passed to function
+             (run untimed before each call), number of calls.
+    Out: dictionary of results; printed as it goes. Output of the code
+             being timed is discarded.
+    """
+    times = []
+    for i in range(repeat):
+        argument = setup() if setup is not None else None
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = T.perf_counter()
+            if setup is not None:
+                function(argument)
+            else:
+                function()
+            times.append(T.perf_counter() - start)
+    result = {'name': name, 'size': size, 'repeat': repeat,
+            'best': min(times), 'median': statistics.median(times),
+            'per_second': size / min(times)}
+    print('{0:32s} {1:8d} {2:10.4f} s {3:12.0f}/s'.format(name, size,
+            result['best'], result['per_second']))
+    return result
+
+def quote_benchmarks():
+    scraper = headline_to_db.StockScraper(False, None)
+    results = []
+    for size in QUOTE_SIZES:
+        csv = fixtures.quotes_csv(fixtures.symbols(size)).decode()
+        results.append(timed('lookup parse', size,
+                lambda: scraper.parse_quotes(csv)))
+        quotes = scraper.parse_quotes(csv)
+        results.append(timed('format_data', size,
+                lambda quotes: [scraper.format_data(quote)
+                for quote in quotes], lambda: copy.deepcopy(quotes)))
+        results.append(timed('format_batch', size, scraper.format_batch,
+                lambda: copy.deepcopy(quotes)))
+    return results
+
+def parse_benchmarks():
+    scraper = headline_to_db.StockScraper(False, None)
+    pages = [fixtures.headline_page(symbol)
+            for symbol in fixtures.symbols(PAGE_COUNT)]
+    return [timed('process_webpage', PAGE_COUNT,
+            lambda: [scraper.process_webpage(news_parser.make_soup(page))
+            for page in pages], repeat=3)]
+
+def escape_benchmarks():
+    rng = random.Random(0)
+    headlines = [fixtures.headline_text(rng).replace('&amp;', '&') +
+            ' ({0})'.format(i) for i in range(HEADLINE_COUNT)]
+    # Distinct strings, and the cache emptied first: no call is a cache hit.
+    return [timed('escape_for_latex', HEADLINE_COUNT,
+            lambda headlines: [latex_escape.escape_for_latex(headline)
+            for headline in headlines],
+            lambda: latex_escape.escape_for_latex.cache_clear() or headlines),
+            timed('escape_all', HEADLINE_COUNT, latex_escape.escape_all,
+            lambda: latex_escape.escape_for_latex.cache_clear() or headlines)]
+
+def ingest_benchmarks(tmp):
+    """StockScraper.process_news against a local stand-in for Yahoo."""
+    server = fixtures.StandInServer()
+    symbols = fixtures.symbols(INGEST_TICKERS)
+    db = os.path.join(tmp, 'ingest.db')
+    try:
+        def scraper():
+            if os.path.exists(db):
+                os.remove(db)
+            scraper = headline_to_db.StockScraper(False, None, workers=8)
+            scraper.news_url = server.news_url
+            scraper.api_results = symbols
+            return scraper
+        def ingest(scraper, again=False):
+            with SQ.connect(db) as connection:
+                scraper.process_news(connection)
+                if again:
+                    scraper.process_news(connection)
+        results = [timed('process_news ingest', INGEST_TICKERS, ingest,
+                scraper, repeat=3)]
+        # The second run finds only headlines already in the db.
+        results.append(timed('process_news ingest x2', INGEST_TICKERS * 2,
+                lambda scraper: ingest(scraper, True), scraper, repeat=3))
+    finally:
+        server.close()
+    return results
+
+def report_benchmarks(tmp, sizes):
+    """db_to_latex.process_news on databases of each size."""
+    results = []
+    here = os.getcwd()
+    for size in sizes:
+        os.chdir(tmp)
+        try:
+            if os.path.exists('hl.db'):
+                os.remove('hl.db')
+            shutil.rmtree('fragments', ignore_errors=True)
+            start = T.perf_counter()
+            symbols = fixtures.make_db('hl.db', size)
+            print('{0:32s} {1:8d} {2:10.4f} s'.format('(making hl.db)', size,
+                    T.perf_counter() - start))
+            results.append(timed('db_to_latex process_news', size,
+                    lambda: db_to_latex.process_news(symbols, io.StringIO(),
+                    REPORT_DAYS), repeat=3))
+            # Every fragment rendered once, untimed; the reruns find nothing
+            #     changed.
+            def fragments():
+                return fragment_cache.FragmentCache('fragments', '.')
+            with contextlib.redirect_stdout(io.StringIO()):
+                db_to_latex.process_news(symbols, io.StringIO(), REPORT_DAYS,
+                        fragments())
+            results.append(timed('db_to_latex fragments rerun', size,
+                    lambda fragments: db_to_latex.process_news(symbols,
+                    io.StringIO(), REPORT_DAYS, fragments), fragments,
+                    repeat=3))
+        finally:
+            os.chdir(here)
+    return results
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(large=False):
+    """Out: dictionary of run information and list of results."""
+    warnings.simplefilter('ignore')
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        results.extend(quote_benchmarks())
+        results.extend(parse_benchmarks())
+        results.extend(escape_benchmarks())
+        results.extend(ingest_benchmarks(tmp))
+        results.extend(report_benchmarks(tmp,
+                DB_SIZES + (LARGE_DB_SIZES if large else ())))
+    return {'revision': git_revision(),
+            'date': D.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results}
+
+def compare(old_path, new_path):
+    """Print each benchmark's time in the new run relative to the old."""
+    with open(old_path, 'r') as f:
+        old = json.load(f)
+    with open(new_path, 'r') as f:
+        new = json.load(f)
+    print('{0} -> {1}'.format(old['revision'], new['revision']))
+    old_results = {(result['name'], result['size']): result
+            for result in old['results']}
+    for result in new['results']:
+        before = old_results.get((result['name'], result['size']))
+        if before is None:
+            continue
+        print('{0:32s} {1:8d} {2:10.4f} s {3:10.4f} s {4:7.2f}x'.format(
+                result['name'], result['size'], before['best'],
+                result['best'], before['best'] / result['best']))
+
+def main(args):
+    if args[:1] == ['compare'] and len(args) == 3:
+        compare(args[1], args[2])
+        return
+    output = 'benchmark_results.json'
+    if '--output' in args:
+        output = args[args.index('--output') + 1]
+    summary = run(large='--large' in args)
+    with open(output, 'w') as f:
+        json.dump(summary, f, indent=1)
+    print('\nResults written to {0}.'.format(output))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -6,130 +6,428 @@
 """Look up vital stock data and headlines in database; format in LaTeX."""
 
 import datetime as D
-import urllib.request as UR
 import urllib.error as UE
 import collections as C
-import re
 import os
+import io
+import sys
 from bs4 import BeautifulSoup as BS
 import time as T
 import sqlite3 as SQ
+import http_client
+import quote_batch
+import records
+import metrics
+import concurrent.futures as CF
+import fragment_cache
+import search
+import retention
+from headline_to_db import migrate_db
+from latex_escape import escape_for_latex, escape_all
 
-def main(filename='stock_list.txt', days_of_history = 7):
+# Yahoo limits quotes to 200 ticker symbols per request.
+YAHOO_LIMIT = 200
+# The report is written through a buffer of this size rather than being
+#     accumulated in memory.
+REPORT_BUFFER_SIZE = 1 << 20
+
+def main(filename='stock_list.txt', days_of_history = 7, metrics_dir=None,
+        searches=(), news=False, fragments=None, chunk_size=None):
     """
     Look up vital stock data and headlines on Yahoo
-    and store to database.
+    and store to database. With metrics_dir set, write timings and counts
+    there (db_to_latex.json and db_to_latex.prom) at the end of the run.
+    searches names saved searches (see search.py) to add sections for.
+    With news set, the report includes the news section, from fragments if
+    a FragmentCache is given, gathered into chunks of chunk_size tickers if
+    that is set.
     """
-    contents, running_tex_str = get_contents(filename)
+    if metrics_dir is not None:
+        metrics.configure()
+    contents = get_contents(filename)
+    tex_file = open_report()
     ################################
     # 1. Stock prices
     # ggg leave this alone for now
-    running_tex_str = process_tickers(contents, running_tex_str)
+    process_tickers(contents, tex_file)
     ###############################
     # 2. Stock news
-    # STOPPED WORKING IN 2016
-#    running_tex_str = process_news(contents, running_tex_str, days_of_history)
+    # STOPPED WORKING IN 2016; only when asked for, from what is in the db.
+    if news:
+        process_news(contents, tex_file, days_of_history, fragments,
+                chunk_size)
+    if searches:
+        process_searches(searches, tex_file)
     ################################
     # 3. Write to output
-    write_contents(running_tex_str)
+    write_contents(tex_file)
+    if metrics_dir is not None:
+        metrics.write(metrics_dir, 'db_to_latex')
 #    print('\n\nFinished headlines.')
 
-def process_tickers(contents, running_tex_str):
+def main_reports(filenames, days_of_history=7, metrics_dir=None, news=False,
+        fragments=None, chunk_size=None, workers=None, searches=()):
+    """
+    Make a report for each of several lists in data/ (output/NAME_report.tex
+    for data/NAME.txt). Prices are looked up, and news queried, once for all
+    their tickers together; the reports are then rendered from those shared
+    results, in parallel. With news set, reports include the news section,
+    from fragments if a FragmentCache is given; each report has a section
+    for each saved search named in searches, run once for all of them.
+    """
+    if metrics_dir is not None:
+        metrics.configure()
+    lists = C.OrderedDict((filename, get_contents(filename))
+            for filename in filenames)
+    # Each ticker once, however many lists it is on.
+    union = list(C.OrderedDict.fromkeys(symbol
+            for contents in lists.values() for symbol in contents))
+    print('{0} lists: {1} tickers, {2} different.'.format(len(lists),
+            sum(len(contents) for contents in lists.values()), len(union)))
+    prices = C.defaultdict(list)
+    for symbol, line in price_lines(union):
+        prices[symbol].append(line)
+    today = D.date.today()
+    first_date = today - D.timedelta(days_of_history - 1)
+    if news and fragments is not None:
+        render_fragments(union, first_date, today, fragments, verbose=False)
+    elif news:
+        with SQ.connect('hl.db') as connection, metrics.timer('db_query'):
+            migrate_db(connection)
+            has_news, dated_news = retrieve_news(connection, union,
+                    first_date, today)
+    search_sections = io.StringIO()
+    if searches:
+        process_searches(searches, search_sections)
+    def write_report(filename):
+        contents = lists[filename]
+        path = report_path(filename)
+        tex_file = open_report(path)
+        write_prices([line for symbol in contents
+                for line in prices.get(symbol, ())], tex_file)
+        if news and fragments is not None:
+            tex_file.write(fragments.inputs(contents, chunk_size,
+                    os.path.splitext(os.path.basename(path))[0]))
+        elif news:
+            with metrics.timer('render', section='news'):
+                write_news(contents, tex_file, first_date, has_news,
+                        dated_news, verbose=False)
+        tex_file.write(search_sections.getvalue())
+        write_contents(tex_file)
+        return path
+    with CF.ThreadPoolExecutor(workers) as executor:
+        for path in executor.map(write_report, lists):
+            print('Wrote {0}.'.format(path))
+    if metrics_dir is not None:
+        metrics.write(metrics_dir, 'db_to_latex')
+
+def report_path(filename):
+    """Out: path of the report for the list in data/filename."""
+    return os.path.join('output',
+            os.path.splitext(os.path.basename(filename))[0] + '_report.tex')
+
+def process_tickers(contents, tex_file):
     """Gather stock data from Yahoo API and output as LaTeX table."""
     # ggg leave this function alone for now.
+    write_prices([line for symbol, line in price_lines(contents)], tex_file)
+
+def price_lines(contents):
+    """
+    In:  list of symbols.
+    Out: list of (symbol, line of the LaTeX prices table), in the order the
+             Yahoo API returned them.
+    """
     list_items = ['Symbol', 'Last trade date', 'Last trade', 'Change',
             'Dividend/share', 'Dividend pay date', 'Ex-dividend date']
-    # Create list of tickers
-    tickers = create_ticker_string(contents)
-    data = lookup(tickers, list_items)
+    data = lookup_batches(contents, list_items)
     list_items.insert(4, 'Percent change')
-    for row_dict in data:
-        row_dict = format_data(row_dict)
+    # Taken before format_batch wraps each symbol in \head{}.
+    symbols = [quote.get('Symbol') for quote in data]
+    with metrics.timer('render', section='prices'):
         # create list of items to go into line of .tex table
-        line_for_table = [row_dict[item] for item in list_items]
-        running_tex_str += ' & '.join(line_for_table) + '\\\\ \hline\n'
-    running_tex_str += \
-            '\\end{tabular}\n \\end{center}\n \\end{table}%\n\\clearpage'
+        return [(symbol, ' & '.join([row_dict[item] for item in list_items]) +
+                '\\\\ \hline\n')
+                for symbol, row_dict in zip(symbols, format_batch(data))]
+
+def write_prices(lines, tex_file):
+    """Write the lines of the prices table and end the table."""
+    tex_file.write(''.join(lines))
+    tex_file.write(
+            '\\end{tabular}\n \\end{center}\n \\end{table}%\n\\clearpage')
     print('\nFinished prices.\n')
-    return running_tex_str
 
-def process_news(contents, running_tex_str, days_of_history):
-    """Scrape news headlines and store to database."""
+def process_news(contents, tex_file, days_of_history, fragments=None,
+        chunk_size=None):
+    """
+    Write the news section of the report from the database. With fragments
+    (a FragmentCache), each ticker's news goes to its own fragment, which
+    the report only \\input's (or, with chunk_size, \\include's in chunks).
+    """
     # Get today's date as date object
     today = D.date.today()
+    # Earliest date in range back in time.
+    first_date = today - D.timedelta(days_of_history - 1)
     # Note that SQLite generates ISO 8601 with `SELECT date('now');`
     #     and these strings can be compared arithmetically, w correct results.
     #
+    if fragments is not None:
+        write_fragments(contents, tex_file, first_date, today, fragments,
+                chunk_size)
+        return
     # Use "with" to keep db file clean
+    with SQ.connect('hl.db') as connection, metrics.timer('db_query'):
+        migrate_db(connection)
+        has_news, news = retrieve_news(connection, contents, first_date, today)
+    with metrics.timer('render', section='news'):
+        write_news(contents, tex_file, first_date, has_news, news)
+
+def write_fragments(contents, tex_file, first_date, last_date, fragments,
+        chunk_size=None):
+    """
+    In:  list of symbols; report file; first and last dates of range;
+             FragmentCache; optional number of tickers per chunk.
+    Out: Renders again the fragments of tickers whose news has changed
+             since they were last rendered; writes the report's \\input
+             lines.
+    """
+    render_fragments(contents, first_date, last_date, fragments)
+    name = os.path.basename(getattr(tex_file, 'name', 'stock_report.tex'))
+    tex_file.write(fragments.inputs(contents, chunk_size,
+            os.path.splitext(name)[0]))
+
+def render_fragments(contents, first_date, last_date, fragments,
+        verbose=True):
+    """
+    In:  list of symbols; first and last dates of range; FragmentCache;
+             whether to print progress for each symbol.
+    Out: Renders again the fragments of tickers whose news has changed
+             since they were last rendered, and saves the manifest.
+    """
+    with SQ.connect('hl.db') as connection, metrics.timer('db_query'):
+        migrate_db(connection)
+        keys = fragment_keys(connection, contents, first_date, last_date)
+        changed = [symbol for symbol in keys
+                if not fragments.is_current(symbol, keys[symbol])]
+        if changed:
+            has_news, news = retrieve_news(connection, changed, first_date,
+                    last_date)
+    metrics.count('fragments_rendered', len(changed))
+    metrics.count('fragments_reused', len(keys) - len(changed))
+    print('{0} of {1} tickers changed.'.format(len(changed), len(keys)))
+    with metrics.timer('render', section='news'):
+        for symbol in changed:
+            fragment = io.StringIO()
+            write_news([symbol], fragment, first_date, has_news, news,
+                    verbose)
+            fragments.store(symbol, keys[symbol], fragment.getvalue())
+        fragments.save()
+
+def write_news(contents, tex_file, first_date, has_news, news, verbose=True):
+    """
+    In:  list of symbols; report file; earliest date in range; symbols and
+             news as from retrieve_news; whether to print progress for each
+             symbol.
+    Out: Writes a section of the report for each symbol.
+    """
+    say = print if verbose else quiet
+    for symbol in contents:
+        say('\n\nNow processing {0}: '.format(symbol),
+                end='') # debug-print
+        section = TickerSection(symbol)
+        # First check for no news at all.
+        if symbol not in has_news:
+            section.finalize('No news found.')
+            say('   No news found.') # debug-print
+        # If we are here, there is some news; add news for each date within
+        #     range, most recent first.
+        elif not news.get(symbol):
+            section.finalize('No news since ' +
+                    first_date.strftime('%A, %B %d, %Y') + '.')
+            say('\n    No news at all.', end='')
+        else:
+            dated_news = news[symbol]
+            say('dates: ', end='') # debug-print
+            for date in sorted(dated_news, reverse=True):
+                tuple_list = dated_news[date]
+                say(date, '({}) '.format(len(tuple_list)), end='')
+                append_dated_hl_to_tex(symbol, make_date_obj(date),
+                        tuple_list, section)
+            section.finalize()
+        section.flush(tex_file)
+
+def quiet(*args, **kwargs):
+    """Stands in for print where progress is not wanted."""
+    pass
+
+class TickerSection():
+    """
+    Section of the report for one ticker. Its body is collected first, so
+    that the header can say whether there was any news before anything is
+    written to the report.
+    """
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.fragments = []
+        self.header = None
+
+    def write(self, fragment):
+        """Collect fragment of the body; same interface as a file."""
+        self.fragments.append(fragment)
+
+    def finalize(self, note=None):
+        """
+        In:  optional note to follow the symbol in the header,
+                 such as 'No news found.'
+        Out: Sets the section header.
+        """
+        if note is None:
+            self.header = '\n\n\section*{' + self.symbol + '}\n'
+        else:
+            self.header = ('\n\n\section*{' + self.symbol + ' --- ' + note +
+                    '}\n')
+
+    def flush(self, tex_file):
+        """Write header and body to tex_file."""
+        if self.header is None:
+            self.finalize()
+        tex_file.write(self.header)
+        tex_file.write(''.join(self.fragments))
+        self.fragments = []
+
+def fragment_keys(connection, contents, first_date, last_date):
+    """
+    In:  open connection, list of symbols, first and last dates of range.
+    Out: dictionary of symbol: key of its fragment, in order of contents.
+             The key depends on whether the symbol has any news at all and
+             on the number and highest id of its headlines in range (in
+             hl.db and any archives), all answered from the indexes on
+             headlines.
+    """
+    fill_report_tickers(connection, contents)
+    has_news = tickers_with_news(connection)
+    counts = C.defaultdict(lambda: (0, None))
+    for schema in retention.sources(connection, first_date, last_date):
+        for ticker, count, last_id in connection.execute('''SELECT
+                r.ticker, COUNT(h.id), MAX(h.id)
+                FROM report_tickers AS r JOIN {0}.headlines AS h
+                    ON h.ticker = r.ticker AND h.date BETWEEN ? AND ?
+                GROUP BY r.ticker'''.format(schema),
+                (first_date.isoformat(), last_date.isoformat())).fetchall():
+            before, before_id = counts[ticker]
+            counts[ticker] = (before + count, max(before_id or 0, last_id))
+    keys = C.OrderedDict()
+    for symbol in contents:
+        count, last_id = counts[symbol]
+        # Only 'No news since ...' mentions the range itself.
+        since = first_date if symbol in has_news and not count else ''
+        keys[symbol] = fragment_cache.make_key(symbol, symbol in has_news,
+                count, last_id, since)
+    return keys
+
+def fill_report_tickers(connection, contents):
+    """Put the symbols in the temporary table report_tickers."""
+    connection.execute('''CREATE TEMP TABLE IF NOT EXISTS report_tickers (
+            ticker VARCHAR(5) PRIMARY KEY)''')
+    connection.execute('''DELETE FROM report_tickers''')
+    connection.executemany('''INSERT OR IGNORE INTO report_tickers (ticker)
+            VALUES (?)''', ((symbol, ) for symbol in contents))
+
+def tickers_with_news(connection):
+    """
+    Out: set of the symbols in report_tickers with any news at all, in
+             hl.db or archived.
+    """
+    return {row[0] for row in connection.execute('''SELECT ticker
+            FROM report_tickers WHERE EXISTS (SELECT 1 FROM headlines
+                WHERE headlines.ticker = report_tickers.ticker)
+            OR EXISTS (SELECT 1 FROM archived_tickers
+                WHERE archived_tickers.ticker = report_tickers.ticker)''')}
+
+def retrieve_news(connection, contents, first_date, last_date):
+    """
+    In:  open connection, list of symbols, first and last dates of range.
+    Out: set of symbols with any news at all in the db;
+         dictionary of symbol: {date string: list of tuples}, each tuple
+             containing hl, source, date, url, in order of insertion.
+         Headlines moved to the archives by retention.py are read from
+             there, a month's archive at a time.
+    """
+    # The symbols go into a temporary table, so that each query below is a
+    #     join answered from the indexes on headlines, however long the list.
+    fill_report_tickers(connection, contents)
+    has_news = tickers_with_news(connection)
+    news = C.defaultdict(lambda: C.defaultdict(list))
+    # A date's headlines are all in the same place, so each list is still
+    #     in order of insertion.
+    for schema in retention.sources(connection, first_date, last_date):
+        # Rows are streamed from the cursor rather than fetched all at once.
+        cursor = connection.execute('''SELECT h.ticker, h.headline, h.source,
+                h.date, h.url
+                FROM report_tickers AS r JOIN {0}.headlines AS h
+                    ON h.ticker = r.ticker AND h.date BETWEEN ? AND ?
+                ORDER BY h.id'''.format(schema), (first_date.isoformat(),
+                last_date.isoformat()))
+        for row in cursor:
+            news[row[0]][row[3]].append(row[1:])
+    return has_news, news
+
+def process_searches(names, tex_file, limit=search.DEFAULT_LIMIT):
+    """
+    In:  names of saved searches; report file; most headlines per search.
+    Out: Writes a section of the report for each search, newest first.
+    """
     with SQ.connect('hl.db') as connection:
-        cursor = connection.cursor()
-        for symbol in contents:
-            print('\n\nNow processing {0}: '.format(symbol),
-                    end='') # debug-print
-            # First check for no news at all.
-            cursor = cursor.execute('''SELECT headline FROM headlines '''
-                    '''WHERE ticker=?''', (symbol, ))
-            if not cursor.fetchall():
-                running_tex_str += '\n\n\section*{' + symbol +\
-                        ' --- No news found.}\n'
-                print('   No news found.') # debug-print
-                continue
-            # If we are here, there is some news so create section heading.
-            running_tex_str += '\n\n\section*{' + symbol + '}\n'
-            # Now retrieve news for each date within range back in time.
-            #   Set sentinel for no news found.
-            no_news = True
-            print('dates: ', end='') # debug-print
-            for days_back in range(0, days_of_history):
-                the_date = today - D.timedelta(days_back)
-                print(the_date, end='') # debug-print
-                cursor = cursor.execute('''SELECT headline, source, date, url
-                        FROM headlines WHERE ticker=?
-                        AND date=? ''', (symbol, the_date))
-                # Note that fetchall() returns a list of tuples
-                # If there is news for this date, then send to separate
-                #     function for processing and turn off no-news sentinel.
-                tuple_list = cursor.fetchall()
-                print(' ({}) '.format(len(tuple_list)), end='')
-                if tuple_list:
-                    no_news = False
-#                    print('   sentinel unset for', symbol)
-                    running_tex_str = \
-                            append_dated_hl_to_tex(symbol, the_date, \
-                            tuple_list, running_tex_str)
-            if no_news:
-#                print('\n   sentinel remains SET for', symbol)
-#                print('\n', running_tex_str[-30:])
-                print('\n    No news at all.', end='')
-                running_tex_str = re.sub('{' + symbol + '}$',\
-                        '{' + symbol + ' --- No news since ' +\
-                        the_date.strftime('%A, %B %d, %Y') + '.}',\
-                        running_tex_str)
-#                print('\n', running_tex_str[-50:])
-    return running_tex_str
-
-def append_dated_hl_to_tex(symbol, the_date, tuple_list, running_tex_str):
+        migrate_db(connection)
+        for saved in search.saved_searches(connection, names):
+            with metrics.timer('render', section='search'):
+                write_search(saved, search.run_saved(connection, saved,
+                        limit=limit), tex_file)
+
+def write_search(saved, results, tex_file):
+    """
+    In:  SavedSearch; list of search Results; report file.
+    Out: Writes the section of the report for the search.
+    """
+    header = '\n\n\\section*{Search: ' + escape_for_latex(saved.name)
+    if not results:
+        tex_file.write(header + ' --- No headlines found.}\n')
+        return
+    tex_file.write(header + '}\n' + escape_for_latex(saved.query) + '\n')
+    tex_file.write('\\begin{itemize}')
+    headlines = escape_all(result.headline for result in results)
+    for result, headline in zip(results, headlines):
+        date = (make_date_obj(result.date).strftime('%B %d, %Y') + ': '
+                if result.date else '')
+        tex_file.write('\n\\item\\ \\head{' + result.ticker + '} ' + date +
+                '\\href{' + result.url + '}{' + headline + '} (' +
+                escape_for_latex(result.source) + ')')
+    tex_file.write('\n\\end{itemize}')
+
+def append_dated_hl_to_tex(symbol, the_date, tuple_list, tex_file):
     """
     In:  symbol (=ticker string),
          the_date (single date for the headlines in tuple_list),
          tuple_list: non-empty list of tuples,
              each tuple containing hl, source, date;
-         running_tex_str contains LaTeX preamble and section header for symbol
+         tex_file already has LaTeX preamble and section header for symbol
              and also any subsection headers for headlines with later dates.
-    Out: running_tex_str now has \subsection for this date.
+    Out: tex_file now has \subsection for this date.
     """
     # Begin formatting for LaTeX, for this symbol
-    running_tex_str += '\n\subsection*{' +\
-            the_date.strftime('%A, %B %d, %Y')    + '}\n'
+    tex_file.write('\n\subsection*{' +\
+            the_date.strftime('%A, %B %d, %Y')    + '}\n')
     # Start itemized list of headlines in LaTeX file
-    running_tex_str += '\\begin{itemize}'
-    for i in tuple_list:
+    tex_file.write('\\begin{itemize}')
+    # Headlines are escaped all at once; sources repeat, so escape_for_latex
+    #     mostly finds them in its cache.
+    with metrics.timer('escape'):
+        headlines = escape_all(i[0] for i in tuple_list)
+    for i, headline in zip(tuple_list, headlines):
         # Convert headline_list into string for .tex file
-        running_tex_str += ('\n\item\\ \\href{' + i[3] + '}{' +
-                escape_for_latex(i[0]) + '} (' +
+        tex_file.write('\n\item\\ \\href{' + i[3] + '}{' +
+                headline + '} (' +
                 escape_for_latex(i[1]) + ')')
-    running_tex_str += '\n\end{itemize}'
-    return running_tex_str
+    tex_file.write('\n\end{itemize}')
 
 def make_date_obj(date):
     """
@@ -138,33 +436,11 @@ def make_date_obj(date):
     """
     return D.date(int(date[0:4]), int(date[5:7]), int(date[8:]))
 
-def escape_for_latex(a_string):
-    """Perform simple text replacements for LaTeX compatibility."""
-    # Using ordered dictionary in case order of replacement matters.
-    # HTML forms probably rare in Beautiful Soup output, but retained in case.
-    the_dict = C.OrderedDict([\
-            ('&amp;', r'\&'), \
-            ('&gt;', '>'), \
-            ('&lt;', '<'), \
-            ('&', r'\&'), \
-            (r'\\&', r'\&'), \
-            ('$', r'\$'), \
-            ('%', r'\%'), \
-            ('#', r'\#'), \
-            (' "', ' ``'), \
-            (" '", " `"), \
-            ('"', "''"), \
-            ('\xa0', ' ')])
-    # Next: add curly quotes to this list?
-    for key in the_dict:
-        a_string = a_string.replace(key, the_dict.get(key))
-    return a_string
-
 def lookup(tickers, list_items, stats = 'sd1l1c1dr1q'):
     """
-    Look up a few vital elements in the Yahoo API, return them as a dictionary.
+    Look up a few vital elements in the Yahoo API, return them as Quotes.
     In:  Three arguments needed for accessing Yahoo API.
-    Out: Dictionary of tickers:stats.
+    Out: List of Quotes, one per ticker.
     """
     # Tag information from
     #    https://ilmusaham.wordpress.com/tag/stock-yahoo-data/
@@ -184,15 +460,34 @@ def lookup(tickers, list_items, stats = 'sd1l1c1dr1q'):
     # get Yahoo data as list of lists
     # Below added [0].split('\n') because of apparent change in format.
     # 20150313.
-    data_list = process_url(url, '\r\n')[0].split('\n')
+    data_list = process_url(url, '\r\n')
+    if not data_list:
+        return full_data
+    data_list = data_list[0].split('\n')
+    make_quote = records.quote_maker(list_items)
     for item in data_list:
         one_row = item.split(',')
-        # Next: build dictionary for each "item"
+        # Next: build Quote for each "item"
         #   and append to list full_data
-        #   also, strip quotes while adding item to one_row_dict
-        one_row_dict = {list_item: row_item.strip('"')
-                for list_item, row_item in zip(list_items, one_row)}
-        full_data.append(one_row_dict)
+        #   also, strip quotes while adding item to it
+        full_data.append(make_quote([row_item.strip('"')
+                for row_item in one_row]))
+    return full_data
+
+def lookup_batches(contents, list_items, workers=4):
+    """
+    In:  list of symbols, list of column names, optional number of requests
+             to have in flight at once.
+    Out: list of Quotes, as from lookup(), in the order of contents.
+    """
+    # Split into disjoint batches; Executor.map keeps the order of batches.
+    batches = [create_ticker_string(contents[i:i+YAHOO_LIMIT])
+            for i in range(0, len(contents), YAHOO_LIMIT)]
+    full_data = []
+    with CF.ThreadPoolExecutor(workers) as executor:
+        for rows in executor.map(lambda tickers: lookup(tickers, list_items),
+                batches):
+            full_data.extend(rows)
     return full_data
 
 def process_url(url, split_here = ''):
@@ -202,40 +497,53 @@ def process_url(url, split_here = ''):
          if  URL error, quit.
     """
     try:
-        data_list = UR.urlopen(url).read().strip()
+        with metrics.timer('fetch', endpoint='quotes'):
+            data_list = http_client.urlopen(url).read()
+        metrics.count('bytes_downloaded', len(data_list), endpoint='quotes')
+        data_list = data_list.strip()
         # As of Py3 we get error "Type str doesn't support the buffer API"
         # So convert to Unicode now, because what we received is bytecode
         data_list = data_list.decode().split(split_here)
     except UE.URLError as e:
+        metrics.count('errors', endpoint='quotes')
         print('There is a URLerror\n', e, '\n and url =', url)
         # an empty return string will simply add no length to running value
         data_list = ''
     return data_list
 
-def write_contents(running_tex_str):
+def open_report(path=os.path.join('output', 'stock_report.tex')):
     """
-    In:  Argument is string of LaTeX content without end-of-document matter.
-    Out: Write the contents of the argument
-             and save together with the file_end template.
+    In:  optional path of the report.
+    Out: buffered file object for the report, to which LaTeX fragments are
+             written as they are produced; file_start template already
+             written.
+    """
+    tex_file = open(path, 'w', buffering=REPORT_BUFFER_SIZE)
+    with open(os.path.join('code', 'file_start.tex'), 'r') as f:
+        tex_file.write(f.read())
+    return tex_file
+
+def write_contents(tex_file):
+    """
+    In:  Argument is report file opened by open_report,
+             without end-of-document matter.
+    Out: Write the file_end template and close the file.
          Output is saved to output directory.
     """
     with open(os.path.join('code', 'file_end.tex'), 'r') as f:
-        running_tex_str += f.read()
-    with open(os.path.join('output', 'stock_report.tex'), 'w') as f:
-        f.write(running_tex_str)
+        tex_file.write(f.read())
+    tex_file.close()
     return
 
 def get_contents(filename):
     """
     In:  filename
-    Out: file_start template and the contents of the file named as argument.
+    Out: the contents of the file named as argument.
     """
-    with open(os.path.join('code', 'file_start.tex'), 'r') as f:
-        running_tex_str = f.read()
     with open(os.path.join('data', filename), 'r') as f:
         contents = f.read().split('\n')
         contents = [i for i in contents if i]
-    return contents, running_tex_str
+    return contents
 
 def create_ticker_string(contents):
     """
@@ -246,6 +554,24 @@ def create_ticker_string(contents):
     # Use rstrip in case there had been an extra blank index.
     return tickers.rstrip('+')
 
+def format_batch(data):
+    """
+    In:  list of Quotes
+    Out: Same list, each Quote edited as by format_data, but with
+         percent change computed for the whole batch at once.
+    """
+    # A change equal to the last trade has no base to compare to; as in
+    #   headline_to_db, it is shown as +100.00\% (+0.00\% if both are zero)
+    #   rather than ending the report with ZeroDivisionError.
+    percent, valid, both_zero, no_base = quote_batch.percent_change_column(
+            [quote.change for quote in data],
+            [quote.last_trade for quote in data])
+    for quote, pc_chg in zip(data,
+            quote_batch.format_percent_column(percent, valid, '\\%')):
+        quote.symbol = '\\head{' + quote.symbol + '}'
+        quote.percent_change = pc_chg
+    return data
+
 def format_data(is_dict):
     """
     In:  Dictionary of ticker:statistics
@@ -272,4 +598,21 @@ def format_data(is_dict):
     return is_dict
 
 if __name__ == '__main__':
-    main()
+    filenames = [arg for arg in sys.argv[1:] if not arg.startswith('-')]
+    # --search=NAME, any number of times, for sections from saved searches.
+    searches = [arg.split('=', 1)[1] for arg in sys.argv[1:]
+            if arg.startswith('--search=')]
+    # --chunk=N: news fragments gathered into \include'd files of N tickers.
+    chunk_size = [int(arg.split('=', 1)[1]) for arg in sys.argv[1:]
+            if arg.startswith('--chunk=')]
+    chunk_size = chunk_size[-1] if chunk_size else None
+    # News, if asked for, comes from fragments.
+    if len(filenames) > 1:
+        # Several lists: one report each.
+        main_reports(filenames, news='--news' in sys.argv,
+                fragments=fragment_cache.FragmentCache(),
+                chunk_size=chunk_size, searches=searches)
+    else:
+        main(*filenames, searches=searches, news='--news' in sys.argv,
+                fragments=fragment_cache.FragmentCache(),
+                chunk_size=chunk_size)
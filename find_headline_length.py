@@ -3,17 +3,43 @@
 # 20130225, works
 # Run with Python 3.2
 
+"""
+Lengths of headlines, links and sources scraped from Yahoo headline pages:
+maximum, percentiles and histogram of each, checked against the VARCHAR
+sizes in create_table.sqlscript. Lengths are counted as they are found, so
+memory does not grow with the number of headlines; pages are parsed by
+worker processes, whose counts are merged at the end.
+
+    python find_headline_length.py [tickers file]       live pages
+    python find_headline_length.py archive [YYYY-MM-DD ...]
+                                                        archived pages
+    python find_headline_length.py pages DIRECTORY      saved .html pages
+"""
+
 import datetime as D
-import urllib.request as UR
 import urllib.error as UE
 import collections as C
+import concurrent.futures as CF
 import re
 import os
-from bs4 import BeautifulSoup as BS
 import time as T
 import sys
+from latex_escape import escape_for_latex
+import archive
+import news_parser
+import http_client
+import pipeline
+
+FIELDS = ('headline', 'link', 'source')
+# Columns of the headlines table that hold each field.
+COLUMNS = {'headline': 'headline', 'link': 'url', 'source': 'source'}
+PERCENTILES = (50, 90, 99, 99.9)
+# Lengths per bar of the histograms.
+HISTOGRAM_WIDTH = 16
+VARCHAR_RE = re.compile(r'^\s*(\w+)\s+VARCHAR\((\d+)\)', re.M)
+HEADLINES_TABLE_RE = re.compile(r'CREATE TABLE (IF NOT EXISTS )?headlines\b')
 
-def main(filename='stock_list.txt'):
+def main(filename='stock_list.txt', workers=8, parse_workers=None):
     """
     Find the length of the longest headline, link, and source
     for headlines scraped from the Yahoo financial news pages.
@@ -21,55 +47,184 @@ def main(filename='stock_list.txt'):
     contents = get_contents(filename)
     ################################
     # Stock news
-    process_news(contents)
+    stats = process_news(contents, workers, parse_workers)
     ################################
+    report(stats)
     print('\n\nFinished headlines.')
 
-def process_news(contents):
-    """Scrape news headlines."""
-    # get today's date
-    today = D.date.today().strftime('%Y-%m-%d')
-    # prepare lists to receive lengths of headlines, links, and sources
-    hl_lengths = []
-    link_lengths = []
-    source_lengths = []
-    # now run through each ticker
-    for symbol in contents:
-#        print('\n*******************\nNow processing {0}\n*******************'.\
-#                format(symbol)) # debug-print
-        # Date such as &t=2012-05-14 can be appended to URL
-        url = 'http://finance.yahoo.com/q/h?s=' + symbol + '&t=' + today
-        # Retrieve and process webpage, yielding list of lists
-        webpage = retrieve_webpage(symbol)
-#        headline_list += process_webpage(webpage)
-        hls, links, sources = process_webpage(webpage)
-        hl_lengths.extend(hls)
-        link_lengths.extend(links)
-        source_lengths.extend(sources)
-    print('longest headline:', max(hl_lengths), '\nlongest link:', \
-            max(link_lengths), '\nlongest source:', max(source_lengths))
-#    return running_tex_str
-
-def escape_for_latex(a_string):
-    """Perform simple text replacements for LaTeX compatibility."""
-    # Using ordered dictionary in case order of replacement matters.
-    # HTML forms probably rare in Beautiful Soup output, but retained in case.
-    the_dict = C.OrderedDict([\
-            ('&amp;', '\\&'), \
-            ('&gt;', '>'), \
-            ('&lt;', '<'), \
-            ('&', '\\&'), \
-            ('$', '\\$'), \
-            ('%', '\\%'), \
-            ('#', '\\#'), \
-            (' "', ' ``'), \
-            (" '", " `"), \
-            ('"', "''"), \
-            ('\xa0', ' ')])
-    # Next: add curly quotes to this list?
-    for key in the_dict:
-        a_string = a_string.replace(key, the_dict.get(key))
-    return a_string
+class LengthStats():
+    """
+    Exact count of each length seen, per field. Lengths are short, so there
+    are only a few hundred distinct ones however many headlines are
+    counted; percentiles come out exact, and counts from different
+    processes merge by adding them up.
+    """
+    def __init__(self):
+        self.lengths = {field: C.Counter() for field in FIELDS}
+        self.pages = 0
+
+    def add(self, headline, link, source):
+        self.lengths['headline'][len(headline)] += 1
+        self.lengths['link'][len(link)] += 1
+        self.lengths['source'][len(source)] += 1
+
+    def merge(self, other):
+        """Add other's counts to these; returns self."""
+        for field in FIELDS:
+            self.lengths[field].update(other.lengths[field])
+        self.pages += other.pages
+        return self
+
+    def count(self, field='headline'):
+        return sum(self.lengths[field].values())
+
+    def max(self, field):
+        return max(self.lengths[field], default=None)
+
+    def percentile(self, field, percent):
+        """Out: smallest length at least percent % of lengths are within."""
+        counter = self.lengths[field]
+        wanted = percent / 100 * sum(counter.values())
+        seen = 0
+        for length in sorted(counter):
+            seen += counter[length]
+            if seen >= wanted:
+                return length
+        return None
+
+    def histogram(self, field, width=HISTOGRAM_WIDTH):
+        """Out: list of (lowest length in bucket, count), width per bucket."""
+        buckets = C.Counter()
+        for length, count in self.lengths[field].items():
+            buckets[length // width * width] += count
+        return sorted(buckets.items())
+
+    def over(self, field, limit):
+        """Out: number of lengths greater than limit."""
+        return sum(count for length, count in self.lengths[field].items()
+                if length > limit)
+
+def process_news(contents, workers=8, parse_workers=None):
+    """
+    In:  list of symbols; threads fetching pages; processes parsing them.
+    Out: LengthStats for all the headlines on their pages.
+    """
+    parse_workers = parse_workers or os.cpu_count()
+    stats = LengthStats()
+    with CF.ProcessPoolExecutor(parse_workers) as executor:
+        def parse(retrieved_contents):
+            if not retrieved_contents:
+                return LengthStats()
+            return executor.submit(page_stats, retrieved_contents).result()
+        # Pages are fetched, parsed and counted a few at a time.
+        stages = pipeline.Pipeline([
+                pipeline.Stage('fetch', retrieve_webpage, workers),
+                pipeline.Stage('parse', parse, parse_workers)])
+        for page in stages.run(symbol for symbol in contents if symbol):
+            stats.merge(page)
+    return stats
+
+def process_archive(root=archive.ARCHIVE_DIR, days=None, workers=None):
+    """
+    In:  archive root; optional list of partitions (default all); number of
+             processes.
+    Out: LengthStats for all the archived headline pages.
+    """
+    if not days:
+        days = archive.Archive(root).partitions()
+    workers = workers or os.cpu_count()
+    stats = LengthStats()
+    with CF.ProcessPoolExecutor(workers) as executor:
+        # Every partition is split into as many shards as there are
+        #     processes; each process reads its own pages from the archive.
+        futures = [executor.submit(archive_stats, root, day, (shard, workers))
+                for day in days for shard in range(workers)]
+        for future in CF.as_completed(futures):
+            stats.merge(future.result())
+    return stats
+
+def process_pages(directory, workers=None):
+    """
+    In:  directory of saved pages (*.html); number of processes.
+    Out: LengthStats for all the pages.
+    """
+    paths = sorted(os.path.join(directory, name)
+            for name in os.listdir(directory) if name.endswith('.html'))
+    workers = workers or os.cpu_count()
+    stats = LengthStats()
+    with CF.ProcessPoolExecutor(workers) as executor:
+        for shard in executor.map(file_stats,
+                [paths[i::workers] for i in range(workers)]):
+            stats.merge(shard)
+    return stats
+
+def page_stats(retrieved_contents):
+    """
+    In:  page as retrieved (bytes).
+    Out: LengthStats for its headlines. Module-level, for process pools.
+    """
+    stats = LengthStats()
+    webpage = news_parser.make_soup(retrieved_contents)
+    try:
+        process_webpage(webpage, stats)
+    finally:
+        webpage.decompose()
+    stats.pages = 1
+    return stats
+
+def archive_stats(root, day, shard):
+    """
+    In:  archive root, partition, (number, count) of shard.
+    Out: LengthStats for that shard's pages.
+    """
+    stats = LengthStats()
+    for kind, symbol, url, body in archive.Archive(root).entries(day,
+            archive.PAGE, shard):
+        stats.merge(page_stats(body))
+    return stats
+
+def file_stats(paths):
+    """
+    In:  list of paths of saved pages.
+    Out: LengthStats for those pages.
+    """
+    stats = LengthStats()
+    for path in paths:
+        with open(path, 'rb') as f:
+            stats.merge(page_stats(f.read()))
+    return stats
+
+def varchar_sizes(path=None):
+    """
+    In:  optional path of create_table.sqlscript.
+    Out: dictionary of column: declared size, for the headlines table.
+    """
+    if path is None:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                'create_table.sqlscript')
+    with open(path, 'r') as f:
+        script = f.read()
+    start = HEADLINES_TABLE_RE.search(script).start()
+    table = script[start:script.index(';', start)]
+    return {column: int(size) for column, size in VARCHAR_RE.findall(table)}
+
+def report(stats):
+    """Print maximum, percentiles and histogram of each field."""
+    sizes = varchar_sizes()
+    print('{0} pages, {1} headlines.'.format(stats.pages, stats.count()))
+    for field in FIELDS:
+        if not stats.count(field):
+            continue
+        size = sizes.get(COLUMNS[field])
+        print('\nlongest {0}: {1}'.format(field, stats.max(field)))
+        print('  ' + ', '.join('p{0}: {1}'.format(percent,
+                stats.percentile(field, percent)) for percent in PERCENTILES))
+        if size is not None:
+            print('  VARCHAR({0}): {1} longer'.format(size,
+                    stats.over(field, size)))
+        for low, count in stats.histogram(field):
+            print('  {0:4d}-{1:<4d} {2:9d}'.format(low,
+                    low + HISTOGRAM_WIDTH - 1, count))
 
 def process_url(url, split_here = ''):
     """
@@ -78,12 +233,12 @@ def process_url(url, split_here = ''):
          if  URL error, quit.
     """
     try:
-        data_list = UR.urlopen(url).read().strip()
+        data_list = http_client.urlopen(url).read().strip()
         # As of Py3 we get error "Type str doesn't support the buffer API"
         # So convert to Unicode now, because what we received is bytecode
         data_list = data_list.decode().split(split_here)
     except UE.URLError as e:
-        print('There is a URLerror\n', e, '\n and symbol =', symbol)
+        print('There is a URLerror\n', e, '\n and url =', url)
         # an empty return string will simply add no length to running value
         data_list = ''
     return data_list
@@ -91,28 +246,23 @@ def process_url(url, split_here = ''):
 def retrieve_webpage(symbol):
     """
     In:  symbol (argument)
-    Out: BS object, webpage
+    Out: webpage as retrieved (bytes), or '' on URL error.
     """
     today = D.date.today().strftime('\%Y-\%m-\%d')
     url = 'http://finance.yahoo.com/q/h?s=' + symbol + '&t=' + today
     try:
-        data_list = UR.urlopen(url).read().strip()
+        data_list = http_client.urlopen(url).read().strip()
     except UE.URLError as e:
         print('There is a URLerror\n', e, '\n and symbol =', symbol)
         # an empty return string will be trapped in "if webpage"
         return ''
-    webpage = BS(data_list)
-    return webpage
+    return data_list
 
-def process_webpage(webpage):
+def process_webpage(webpage, stats):
     """
-    In:  webpage formatted by BS
-    Out; list of lists; each sublist contains [headline, link, source, date]
+    In:  webpage formatted by BS; LengthStats
+    Out; stats, with the lengths of each headline, link and source added.
     """
-    # prepare count of longest items
-    hl_lengths = []
-    link_lengths = []
-    source_lengths = []
     if webpage:
         for item in webpage.find_all('li'):
             try:
@@ -123,24 +273,22 @@ def process_webpage(webpage):
                 # Link
                 link = item.a.attrs['href']
                 # many URLs have Yahoo-tracking prefix, which we strip
-                link = re.sub('http.+?\*', '', link)
+                link = news_parser.TRACKER_RE.sub('', link)
                 #
                 # Source, from which the date must be removed
                 source = str(item.cite).replace('\xa0'+str(item.span), '')
                 if source == 'None':
                     continue
                 # replace <cite> and </cite> tags
-                source = re.sub('<\/?cite>', '', source)
+                source = news_parser.CITE_TAG_RE.sub('', source)
                 # if Yahoo is supplying a link with a tracker, remove ``at ''
                 source = source.strip('at ')
                 source = escape_for_latex(source)
                 #
-                hl_lengths.append(len(headline))
-                link_lengths.append(len(link))
-                source_lengths.append(len(source))
+                stats.add(headline, link, source)
             except Exception as e:
                 continue
-    return hl_lengths, link_lengths, source_lengths
+    return stats
 
 def get_contents(filename):
     """
@@ -188,4 +336,9 @@ def format_data(is_dict):
     return is_dict
 
 if __name__ == '__main__':
-    main()
+    if sys.argv[1:2] == ['archive']:
+        report(process_archive(days=sys.argv[2:]))
+    elif sys.argv[1:2] == ['pages'] and len(sys.argv) == 3:
+        report(process_pages(sys.argv[2]))
+    else:
+        main(*sys.argv[1:2])
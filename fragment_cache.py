@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# fragment_cache.py
+# 20261018
+
+"""
+The news section of the report kept as one LaTeX fragment per ticker, which
+the report pulls in with \\input. Each fragment is stored with a key made
+from what it was rendered from; a ticker whose key has not changed since
+the last run is neither queried nor rendered again.
+
+Layout: output/fragments/TICKER.tex per ticker (characters other than
+letters and digits written as -XX, in hex), and manifest.json with the key
+of each. Reports for different lists of tickers can share the directory.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+REPORT_DIR = 'output'
+FRAGMENT_DIR = os.path.join(REPORT_DIR, 'fragments')
+MANIFEST = 'manifest.json'
+# Change whenever fragments would be rendered differently from the same
+#     rows, so that every one is made again.
+FRAGMENT_VERSION = 1
+UNSAFE_RE = re.compile(r'[^A-Za-z0-9]')
+
+def make_key(*parts):
+    """Out: hex digest of parts, with FRAGMENT_VERSION."""
+    text = '|'.join(str(part) for part in (FRAGMENT_VERSION, ) + parts)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+class FragmentCache():
+    def __init__(self, directory=FRAGMENT_DIR, report_dir=REPORT_DIR):
+        """
+        In:  directory of the fragments; directory of the report, which the
+                 names in \\input are relative to.
+        """
+        self.directory = directory
+        self.report_dir = report_dir
+        # Names in \input are relative to the report.
+        self.prefix = os.path.relpath(directory, report_dir).replace(os.sep,
+                '/') + '/'
+        self.manifest_path = os.path.join(directory, MANIFEST)
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self.manifest_path, 'r') as f:
+                self.keys = json.load(f)
+        except (OSError, ValueError):
+            self.keys = {}
+
+    def file_name(self, symbol):
+        return UNSAFE_RE.sub(lambda match: '-{0:02X}'.format(
+                ord(match.group())), symbol)
+
+    def path(self, name):
+        return os.path.join(self.directory, name + '.tex')
+
+    def input_name(self, name):
+        """Out: name of the fragment as \\input or \\include in the report."""
+        return self.prefix + name
+
+    def is_current(self, symbol, key):
+        """Out: whether symbol's fragment was rendered with key."""
+        return (self.keys.get(symbol) == key and
+                os.path.exists(self.path(self.file_name(symbol))))
+
+    def store(self, symbol, key, text):
+        """Write symbol's fragment; the key is saved by save()."""
+        write_file(self.path(self.file_name(symbol)), text)
+        self.keys[symbol] = key
+
+    def save(self):
+        """Write the manifest, after the fragments it describes."""
+        write_file(self.manifest_path, json.dumps(self.keys, indent=0,
+                sort_keys=True))
+
+    def inputs(self, symbols, chunk_size=None, name='stock_report'):
+        """
+        In:  list of symbols, in report order; optional number of tickers
+                 per chunk; name of the report, for naming its chunks.
+        Out: LaTeX pulling the fragments into the report: an \\input for
+                 each or, with chunk_size, an \\include for each chunk file
+                 of chunk_size \\inputs, so that \\includeonly can pick out
+                 parts of a long report to typeset.
+        """
+        lines = ['\n\\input{' + self.input_name(self.file_name(symbol)) + '}'
+                for symbol in symbols]
+        if not chunk_size:
+            return ''.join(lines) + '\n'
+        includes = []
+        for number, start in enumerate(range(0, len(lines), chunk_size), 1):
+            chunk = '{0}-chunk-{1:04d}'.format(name, number)
+            text = ''.join(lines[start:start + chunk_size]) + '\n'
+            # Left alone if unchanged, so that its .aux file stays valid.
+            if read_file(self.path(chunk)) != text:
+                write_file(self.path(chunk), text)
+            includes.append('\n\\include{' + self.input_name(chunk) + '}')
+        return ''.join(includes) + '\n'
+
+def read_file(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def write_file(path, text):
+    """Replace path whole, so that nothing reads a half-written file."""
+    with open(path + '.tmp', 'w') as f:
+        f.write(text)
+    os.replace(path + '.tmp', path)
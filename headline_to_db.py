@@ -8,17 +8,39 @@
 import datetime
 import urllib.request
 import urllib.error
+import urllib.parse
 import collections
-import re
+import concurrent.futures
+import threading
 import os
-import bs4
 import time
 import sqlite3
 import sys
+import news_parser
+import archive
+import http_cache
+import http_client
+import scheduler
+import quote_batch
+import records
+import metrics
+import pipeline
+import ratelimit
+import retention
+
+# Indexes and tables created by migrate_db.sqlscript.
+MIGRATION_OBJECTS = {'headlines_ticker_headline', 'headlines_ticker_date',
+        'refresh', 'prices_share_lookupdate', 'headlines_fts',
+        'headlines_fts_insert', 'headlines_fts_delete', 'headlines_fts_update',
+        'searches', 'archived_tickers', 'prices_share_lookup_trade'}
+# Quote batches (and headline pages) requested at once by main and the
+#     daemon; no more than per_host_limit of them are in flight to Yahoo.
+DEFAULT_WORKERS = 4
 
 
 class StockScraper():
-    def __init__(self, verbose, filename):
+    def __init__(self, verbose, filename, workers=1, per_host_limit=4,
+            parse_workers=0, archive=None, cache=None):
         self.verbose = verbose
         self.api_results = None
         self.tag_names = ['Symbol', 'Last trade date', 'Last trade', 'Change',
@@ -35,6 +57,40 @@ class StockScraper():
                        'Ex-dividend date': 'q'}
         self.filename = filename
         self.ticker_str = None
+        self.news_url = 'http://finance.yahoo.com/q/h?s={0}&t={1}'
+        self.quote_url = 'http://finance.yahoo.com/d/quotes.csv?s={0}&f={1}'
+        # Number of headline pages fetched at once; 1 means strictly serial.
+        self.workers = workers
+        # No more than this many requests may be in flight to any one host.
+        self.per_host_limit = per_host_limit
+        self.host_semaphores = {}
+        self.host_lock = threading.Lock()
+        # With parse_workers > 0, pages are parsed in a pool of processes.
+        self.parse_workers = parse_workers
+        self.parse_pool = None
+        # Items each queue of the fetch/parse pipeline can hold; the
+        #     pipeline of the last fetch_news, for its report.
+        self.queue_size = 32
+        self.pipeline = None
+        # If an archive.Archive is given, every response is also stored there.
+        self.archive = archive
+        # If an http_cache.HTTPCache is given, responses come from it when
+        #     they are fresh enough.
+        self.cache = cache
+        # The retention.Retention whose archives a headline is looked up in
+        #     before it is stored as new; None for the shared one.
+        self.retention = None
+        # Scraped headlines are written to the db in batches of this size.
+        self.insert_batch_size = 500
+        # With schedule set, process_news fetches only tickers due for
+        #     refreshing (see scheduler.py), at most request_budget of them.
+        self.schedule = False
+        self.request_budget = None
+        # Where the daemon writes metrics after each cycle, if anywhere.
+        self.metrics_dir = None
+        # Dictionary of kind of response: ratelimit.Endpoint, or None for no
+        #     rate limiting or retries.
+        self.endpoints = None
 
     def debug_print(self, *args, end='\n'):
         if self.verbose:
@@ -42,8 +98,17 @@ class StockScraper():
         else:
             pass
 
-    def process_tickers(self):
-        """Gather stock data from Yahoo API and output as LaTeX table."""
+    def process_tickers(self, connection=None):
+        """
+        Gather stock data from Yahoo API, store to prices table (through
+        connection if given, else through a new one to hl.db) and output as
+        LaTeX table.
+        """
+        if connection is None:
+            with sqlite3.connect('hl.db') as connection:
+                return self.process_tickers(connection)
+        migrate_db(connection)
+        today = datetime.date.today()
         # Create list of tickers
         # We determined experimentally that Yahoo starts failing to respond
         #     when there are more than 200 tickers; in addition, Yahoo returned
@@ -51,23 +116,36 @@ class StockScraper():
         #     ticker symbols at a time. Please adjust your request to include
         #     200 or less."
         yahoo_limit = 200
-        # Empty set to start with
+        # Split the whole list into disjoint batches of at most yahoo_limit
+        #     tickers and send up to self.workers of them at once.
+        #     Executor.map yields results in the order of the batches, so rows
+        #     are merged back in the order of the original list.
+        batches = [self.api_results[i:i+yahoo_limit]
+                for i in range(0, len(self.api_results), yahoo_limit)]
         data = []
-        # We don't want to destroy self.api_results in this process.
-        temp_api_results = self.api_results
-        while temp_api_results:
-            self.create_ticker_string(yahoo_limit)
-            temp_api_results = temp_api_results[yahoo_limit:]
-            data.extend(self.lookup())
-        self.tag_names.insert(4, 'Percent change')
+        with concurrent.futures.ThreadPoolExecutor(
+                max(1, self.workers)) as executor:
+            ticker_strs = [self.create_ticker_string(batch)
+                    for batch in batches]
+            for rows in executor.map(self.lookup, ticker_strs):
+                columns = self.percent_batch(rows)
+                # Each batch is stored as soon as it arrives, with percent
+                #     change as computed; it is formatted only for printing.
+                self.store_prices(connection, rows, today, columns)
+                if self.verbose:
+                    self.format_batch(rows, columns)
+                data.extend(rows)
+        # Copy, since lookup still needs the list without 'Percent change'
+        #     if this is run again, as by the daemon.
+        tag_names = self.tag_names[:]
+        tag_names.insert(4, 'Percent change')
         self.debug_print('\nBelow we dump the dictionary of lists; each '
                 'list contains '
                 'values collected from the Yahoo API for a given ticker.')
         for row_dict in data:
-            row_dict = self.format_data(row_dict)
             # create list of items to go into line of .tex table
             line_for_table = [row_dict[item]
-                    for item in self.tag_names
+                    for item in tag_names
                     if item in row_dict]
             # For now, print to STDOUT;
             #    LaTeX output to be handled in other program
@@ -76,109 +154,342 @@ class StockScraper():
 
     def get_api_results(self):
         """
-        In:  filename
-        Out: the contents of the file named as argument.
+        In:  self.filename: name of a list in data/, or list of names.
+        Out: the symbols in the file(s), each once, in the order first found.
         """
-        with open(os.path.join('data', self.filename), 'r') as f:
-            self.api_results = f.read().split('\n')
-        self.api_results = [i for i in self.api_results if i]
+        filenames = ([self.filename] if isinstance(self.filename, str)
+                else self.filename)
+        self.api_results = []
+        for filename in filenames:
+            with open(os.path.join('data', filename), 'r') as f:
+                self.api_results.extend(f.read().split('\n'))
+        # Tickers on several lists are looked up once.
+        self.api_results = list(collections.OrderedDict.fromkeys(
+                i for i in self.api_results if i))
         return self.api_results
 
-    def create_ticker_string(self, limit):
+    def create_ticker_string(self, symbols):
         """
-        In: Yahoo's upper limit of tickers per REQUEST
-        Out: Assigns to self.ticker a string of plus-sign-delimited symbols.
+        In: list of symbols, no more than Yahoo's upper limit per REQUEST
+        Out: Assigns to self.ticker_str a string of plus-sign-delimited
+             symbols, and returns it.
         """
-        self.ticker_str = '+'.join(self.api_results[:limit])
         # Use rstrip in case there had been an extra blank index.
-        self.ticker_str.rstrip('+')
+        self.ticker_str = '+'.join(symbols).rstrip('+')
+        return self.ticker_str
 
-    def process_news(self):
-        """Scrape news headlines and store to database."""
+    def process_news(self, connection=None):
+        """
+        Scrape news headlines and store to database, through connection if
+        given (as by the daemon), else through a new one to hl.db.
+        If self.schedule is set, only tickers due for refreshing are fetched,
+        no more than self.request_budget of them.
+        """
+        if connection is None:
+            # Use "with" to keep db file clean
+            with sqlite3.connect('hl.db') as connection:
+                return self.process_news(connection)
         # Get today's date as datetime object
         today = datetime.date.today()
         # Note that SQLite generates ISO 8601 with `SELECT date('now');`
         #   and these strings can be compared arithmetically, w correct results.
         #
-        # Use "with" to keep db file clean
+        # Redundant insertions are prevented by the UNIQUE index on
+        #   (ticker, headline), so there is no need to copy the db first.
+        migrate_db(connection)
+        new_headline_count = 0
+        old_headline_count = 0
+        rows = []
+        symbols = self.api_results
+        if self.schedule:
+            symbols = scheduler.due_symbols(connection, symbols,
+                    self.request_budget)
+            print('{0} of {1} tickers due for refreshing.'.format(
+                    len(symbols), len(self.api_results)))
+        # Symbols whose pages were retrieved, their new headlines, and the
+        #     number and oldest date of the headlines on each page.
+        fetched = []
+        added_by_symbol = collections.Counter()
+        pages = {}
+        # Pages arrive in completion order when fetched concurrently. This
+        #     thread is the pipeline's last stage: the only one writing.
+        store = pipeline.Stage('store', None)
+        for symbol, headline_list in pipeline.consume(
+                self.fetch_news(symbols), store):
+            self.debug_print('\nNow processing {0}: '.format(symbol))
+            if headline_list is None:
+                continue
+            fetched.append(symbol)
+            self.debug_print('length of headline_list:', len(headline_list))
+            dates = []
+            for headline, link, source, newsdate in headline_list:
+                news_date_str = self.convert_news_date(newsdate, today)
+                if news_date_str is None:
+                    print('  Date exception for', symbol)
+                    continue
+                self.debug_print(' scraped:', symbol, newsdate, headline)
+                rows.append((symbol, headline, link, source,
+                        news_date_str, today))
+                dates.append(news_date_str)
+            if dates:
+                pages[symbol] = (len(dates), datetime.datetime.strptime(
+                        min(dates), '%Y-%m-%d').timestamp())
+            if len(rows) >= self.insert_batch_size:
+                added = self.insert_headlines(connection, rows,
+                        added_by_symbol)
+                new_headline_count += added
+                old_headline_count += len(rows) - added
+                rows = []
+        started = time.perf_counter()
+        added = self.insert_headlines(connection, rows, added_by_symbol)
+        store.record(busy=time.perf_counter() - started)
+        new_headline_count += added
+        old_headline_count += len(rows) - added
+        scheduler.record_fetches(connection, fetched, added_by_symbol,
+                pages=pages)
+        metrics.count('headlines_new', new_headline_count)
+        metrics.count('headlines_old', old_headline_count)
+        print('\n\n{0} new headlines added; {1} old headlines found.'.
+                format(new_headline_count, old_headline_count))
+        if self.pipeline is not None:
+            for line in pipeline.format_report(
+                    self.pipeline.report([store])):
+                print(line)
+
+    def convert_news_date(self, newsdate, today):
+        """
+        In:  newsdate as scraped, e.g. 'Fri, Mar 13'; today (date object).
+        Out: ISO 8601 date string, or None if newsdate cannot be parsed.
+        """
+        # Problem: Yahoo's dates in headlines have no year;
+        #    if we convert, we will get 1900 for the year.
+        #    So prefix current year to date of news,
+        #    unless month of news is higher than current month
+        #    (i.e., previous year).
+        #    (Assumes no news is more than 11 months old;
+        #    untrue for ARTIX, for example, which had
+        #    February 29, 2012 when accessed on 20130306,
+        #    causing a Python error.)
+        try:
+            news_date = datetime.datetime.strptime(newsdate, '%a, %b %d')
+        except:
+            return None
+        if today.month < news_date.month:
+            news_year = today.year - 1
+        else:
+            news_year = today.year
+        news_date = datetime.datetime(news_year,
+                news_date.month,
+                news_date.day)
+        return datetime.datetime.strftime(news_date, '%Y-%m-%d')
+
+    def insert_headlines(self, connection, rows, added_by_symbol=None):
+        """
+        In:  open connection; list of (ticker, headline, url, source, date,
+                 lookupdate) tuples; optional Counter of new rows per ticker,
+                 to be updated.
+        Out: number of rows actually added; rows whose (ticker, headline) is
+                 already in the db, or in its archives (see retention.py),
+                 are ignored.
+        """
+        archived = (self.retention or retention.DEFAULT_RETENTION).archived(
+                connection, rows)
+        if archived:
+            rows = [row for row in rows if tuple(row[:2]) not in archived]
+        if not rows:
+            return 0
+        # One transaction and one statement for the whole batch.
+        with metrics.timer('db_insert', table='headlines'), connection:
+            if added_by_symbol is not None:
+                last_id = connection.execute(
+                        'SELECT COALESCE(MAX(id), 0) FROM headlines'
+                        ).fetchone()[0]
+            cursor = connection.executemany('''INSERT OR IGNORE INTO headlines (
+                    ticker, headline, url, source, date,
+                    lookupdate) VALUES (?, ?, ?, ?, ?, ?);''', rows)
+            if added_by_symbol is not None:
+                # New rows are exactly those with higher ids.
+                added_by_symbol.update(dict(connection.execute(
+                        '''SELECT ticker, COUNT(*) FROM headlines WHERE id > ?
+                        GROUP BY ticker''', (last_id, ))))
+        return cursor.rowcount
+
+    def run_daemon(self, interval=60*60, cycles=None, request_budget=None):
+        """
+        In:  seconds from the start of one cycle to the next; optional number
+                 of cycles (default: until interrupted); optional largest
+                 number of headline pages requested per cycle (default:
+                 self.request_budget).
+        Out: Looks up prices and refreshes due headlines every cycle, keeping
+                 the db connection, HTTP connections and rate limits between
+                 cycles.
+        """
+        if self.endpoints is None:
+            self.endpoints = ratelimit.default_endpoints()
+        self.schedule = True
+        if request_budget is not None:
+            self.request_budget = request_budget
+        cycle = 0
         with sqlite3.connect('hl.db') as connection:
-            cursor = connection.cursor()
-            # We need a copy of the existing db to prevent reduncant insertions
-            cursor = cursor.execute('''SELECT ticker,headline FROM headlines''')
-            current_db = cursor.fetchall()
-            new_headline_count = 0
-            old_headline_count = 0
-            for symbol in self.api_results:
-                print('\nNow processing {0}: '.format(symbol), end='')
-                # Date such as &t=2012-05-14 can be appended to URL
-                url = ('http://finance.yahoo.com/q/h?s=' + symbol + '&t=' +
-                        today.isoformat())
-                # Retrieve and process webpage, yielding list of lists
-                webpage = self.retrieve_webpage(symbol)
-                headline_list = self.process_webpage(webpage)
-                self.debug_print('length of headline_list:', len(headline_list))
-                for headline, link, source, newsdate in headline_list:
-                    # Make sure nothing redundant is added;
-                    #   for now check if symbol and headline already present
-                    #   but later consider catch exception on INSERT
-                    #       (must make them UNIQUE in db)
-                    if (symbol, headline) in current_db:
-                        old_headline_count += 1
-                        self.debug_print(' found:', symbol, newsdate, headline)
-                        continue
-                    else:
-                        self.debug_print(' added:', symbol, newsdate, headline)
-                    # Problem: Yahoo's dates in headlines have no year;
-                    #    if we convert, we will get 1900 for the year.
-                    #    So prefix current year to date of news,
-                    #    unless month of news is higher than current month
-                    #    (i.e., previous year).
-                    #    (Assumes no news is more than 11 months old;
-                    #    untrue for ARTIX, for example, which had
-                    #    February 29, 2012 when accessed on 20130306,
-                    #    causing a Python error.)
-                    try:
-                        news_date = datetime.datetime.strptime(newsdate,
-                                '%a, %b %d')
-                    except:
-                        print('  Date exception for', symbol)
-                        continue
-                    if today.month < news_date.month:
-                        news_year = today.year - 1
-                    else:
-                        news_year = today.year
-                    news_date = datetime.datetime(news_year,
-                            news_date.month,
-                            news_date.day)
-                    news_date_str = datetime.datetime.strftime(news_date,
-                            '%Y-%m-%d')
-                    #
-                    # Add it to database
-                    new_headline_count += 1
-                    cursor.execute('''INSERT INTO headlines (
-                            ticker, headline, url, source, date, 
-                            lookupdate) VALUES (?, ?, ?, ?, ?, ?);''',
-                            (symbol, headline, link, source, news_date_str,
-                                today))
-                    print('.', end='')
-                    if news_date == today:
-                        print('  news date:', news_date, i)
-            print('\n\n{0} new headlines added; {1} old headlines found.'.
-                    format(new_headline_count, old_headline_count))
-
-    def process_url(self, url, split_here = ''):
-        """
-        In:  url and optional to-split-at string (arguments)
+            while cycles is None or cycle < cycles:
+                started = time.monotonic()
+                try:
+                    # Re-read the list, in case it has been edited.
+                    self.get_api_results()
+                    self.process_tickers(connection)
+                    self.process_news(connection)
+                except KeyboardInterrupt:
+                    break
+                except Exception as e:
+                    # One bad cycle should not end the daemon.
+                    print('Cycle {0} failed: {1!r}'.format(cycle, e))
+                cycle += 1
+                print('Cycle {0} done; circuits: {1}'.format(cycle,
+                        {name: endpoint.breaker.state
+                        for name, endpoint in self.endpoints.items()}))
+                if self.metrics_dir is not None:
+                    # Counts so far, for scraping between cycles.
+                    metrics.write(self.metrics_dir)
+                if cycles is not None and cycle >= cycles:
+                    break
+                try:
+                    time.sleep(max(0, interval - (time.monotonic() - started)))
+                except KeyboardInterrupt:
+                    break
+
+    def fetch_news(self, symbols):
+        """
+        In:  list of symbols (argument)
+        Out: generator of (symbol, headline_list) pairs. With self.workers
+             set to 1 and no parse workers, pages are fetched and parsed
+             serially and come back in list order; otherwise they go
+             through self.pipeline, self.workers threads fetching and
+             self.parse_workers processes (or one thread) parsing, and come
+             back in completion order.
+        """
+        self.pipeline = None
+        if self.workers <= 1 and self.parse_workers <= 0:
+            for symbol in symbols:
+                yield self.fetch_headlines(symbol)
+            return
+        if self.parse_workers > 0:
+            self.parse_pool = concurrent.futures.ProcessPoolExecutor(
+                    self.parse_workers)
+        try:
+            # Bounded queues between the stages keep no more than a few
+            #     pages per stage in memory, however many tickers there are.
+            self.pipeline = pipeline.Pipeline([
+                    pipeline.Stage('fetch', lambda symbol: (symbol,
+                    self.fetch_webpage(symbol)), max(1, self.workers)),
+                    pipeline.Stage('parse', self.parse_fetched,
+                    max(1, self.parse_workers))], self.queue_size)
+            yield from self.pipeline.run(symbols)
+        finally:
+            if self.parse_pool is not None:
+                self.parse_pool.shutdown()
+                self.parse_pool = None
+
+    def fetch_headlines(self, symbol):
+        """
+        In:  symbol (argument)
+        Out: tuple of symbol and list of Headlines from process_webpage,
+                 or None in place of the list if the page was not retrieved.
+        """
+        return self.parse_fetched((symbol, self.fetch_webpage(symbol)))
+
+    def parse_fetched(self, fetched):
+        """
+        In:  tuple of symbol and page as retrieved, or None.
+        Out: tuple of symbol and list of Headlines from process_webpage,
+                 or None in place of the list if the page was not retrieved.
+        """
+        symbol, retrieved_contents = fetched
+        if retrieved_contents is None:
+            return symbol, None
+        with metrics.timer('parse', endpoint='page'):
+            if self.parse_pool is None:
+                webpage = self.retrieve_webpage_from(retrieved_contents)
+                try:
+                    return symbol, self.process_webpage(webpage)
+                finally:
+                    # Frees the tree at once; see news_parser.parse_page.
+                    webpage.decompose()
+            # Parsing is CPU-bound, so hand it to another process; this
+            #     thread only waits for the result.
+            return symbol, self.parse_pool.submit(news_parser.parse_page,
+                    retrieved_contents).result()
+
+    def host_semaphore(self, url):
+        """
+        In:  url (argument)
+        Out: semaphore limiting requests in flight to the url's host.
+        """
+        host = urllib.parse.urlsplit(url).netloc
+        with self.host_lock:
+            if host not in self.host_semaphores:
+                self.host_semaphores[host] = threading.BoundedSemaphore(
+                        self.per_host_limit)
+            return self.host_semaphores[host]
+
+    def open_url(self, url, kind):
+        """
+        In:  url, kind of response ('quotes' or 'page').
+        Out: tuple of contents (bytes, stripped) and whether they were
+                 downloaded now rather than taken from the cache.
+        """
+        if self.cache is not None:
+            retrieved_contents, downloaded = self.cache.fetch(url, kind,
+                    lambda request: self.request_url(request, kind))
+        else:
+            retrieved_contents = self.request_url(url, kind).read()
+            downloaded = True
+        if downloaded:
+            metrics.count('bytes_downloaded', len(retrieved_contents),
+                    endpoint=kind)
+        else:
+            metrics.count('cache_hits', endpoint=kind)
+        return retrieved_contents.strip(), downloaded
+
+    def request_url(self, url, kind):
+        """
+        In:  url (string or urllib.request.Request), kind of response.
+        Out: response from the network, subject to the per-host limit and,
+                 if self.endpoints is set, to the rate limit, retries and
+                 circuit breaker for that kind of response.
+        """
+        with self.host_semaphore(url if isinstance(url, str)
+                else url.full_url):
+            if self.endpoints is None:
+                return self.timed_urlopen(url, kind)
+            return self.endpoints[kind].call(self.timed_urlopen, url, kind)
+
+    def timed_urlopen(self, url, kind):
+        """
+        In:  url (string or urllib.request.Request), kind of response.
+        Out: response, as from http_client.urlopen; its latency is recorded
+                 for the kind of response.
+        """
+        with metrics.timer('fetch', endpoint=kind):
+            return http_client.urlopen(url)
+
+    def process_url(self, url, split_here = '', archive_key=''):
+        """
+        In:  url and optional to-split-at string (arguments),
+             optional key under which to archive the quotes.
         Out: returns list of discrete paragraph-contents, cast to UTF-8;
              if  URL error, quit.
         """
         try:
-            retrieved_contents = urllib.request.urlopen(url).read().strip()
+            retrieved_contents, downloaded = self.open_url(url, 'quotes')
+            if self.archive is not None and downloaded:
+                self.archive.store(archive.QUOTES, archive_key, url,
+                        retrieved_contents)
             # As of Py3 we get error "Type str doesn't support the buffer API"
             # So convert to Unicode now, because what we received is bytecode
             retrieved_contents = retrieved_contents.decode().split(split_here)
         except urllib.error.URLError as e:
-            print('There is a URLerror\n', e, '\n and symbol =', symbol)
+            metrics.count('errors', endpoint='quotes')
+            print('There is a URLerror\n', e, '\n and url =', url)
             # an empty return string will simply add no length to running value
             retrieved_contents = ''
         return retrieved_contents
@@ -188,63 +499,50 @@ class StockScraper():
         In:  symbol (argument)
         Out: BS object, webpage
         """
+        return self.retrieve_webpage_from(self.fetch_webpage(symbol))
+
+    def retrieve_webpage_from(self, retrieved_contents):
+        """
+        In:  webpage as retrieved (bytes), or None.
+        Out: BS object, webpage
+        """
+        if retrieved_contents is None:
+            # None will be trapped in "if webpage"
+            return None
+        return news_parser.make_soup(retrieved_contents)
+
+    def fetch_webpage(self, symbol):
+        """
+        In:  symbol (argument)
+        Out: webpage as retrieved (bytes), or None on URL error.
+        """
         today = datetime.date.today().strftime('\%Y-\%m-\%d')
-        url = 'http://finance.yahoo.com/q/h?s=' + symbol + '&t=' + today
+        url = self.news_url.format(symbol, today)
         try:
-            retrieved_contents = urllib.request.urlopen(url).read().strip()
+            retrieved_contents, downloaded = self.open_url(url, 'page')
         except urllib.error.URLError as e:
+            metrics.count('errors', endpoint='page')
             print('There is a URLerror\n', e, '\n and symbol =', symbol)
-            # an empty return string will be trapped in "if webpage"
             return None
-        return bs4.BeautifulSoup(retrieved_contents)
+        metrics.count('pages')
+        if self.archive is not None and downloaded:
+            self.archive.store(archive.PAGE, symbol, url, retrieved_contents)
+        return retrieved_contents
 
-    def process_webpage(self, webpage):
+    def process_webpage(self, webpage, today=None):
         """
-        In:  webpage formatted by BS
-        Out; list of lists; each sublist contains [headline, link, source, date]
+        In:  webpage formatted by BS; optional date the page was retrieved,
+                 if not today.
+        Out; list of Headlines, each (headline, link, source, date)
         """
-        headline_list = []
-        if webpage:
-            for item in webpage.find_all('li'):
-                try:
-                    # Headline
-                    headline = item.a.text
-                    #
-                    # Link
-                    link = item.a.attrs['href']
-                    # many URLs have Yahoo-tracking prefix, which we strip
-                    link = re.sub('http.+?\*', '', link)
-                    #
-                    # Source, from which the date must be removed
-                    source = str(item.cite).replace('\xa0'+str(item.span), '')
-                    if source == 'None':
-                        continue
-                    # replace <cite> and </cite> tags
-                    source = re.sub('<\/?cite>', '', source)
-                    # if Yahoo is supplying a link with a tracker, remove ``at ''
-                    source = re.sub('^at ', '', source)
-                    #
-                    # Date
-                    newsdate = item.span.text
-                    # replace parens
-                    newsdate = re.sub('\(|\)', '', newsdate)
-                    # If no date is given (string i.e., contains 'AM' or 'PM'),
-                    #   then we supply current local date.
-                    if newsdate.count('AM') or newsdate.count('PM'):
-                         newsdate = time.strftime('%a, %b %d', time.localtime())
-                    #
-                    # Done
-                    headline_list.append([headline, link, source, newsdate])
-                except Exception as e:
-                    continue
-        return headline_list
+        return news_parser.parse_headlines(webpage, today)
 
-    def lookup(self):
+    def lookup(self, ticker_str=None):
         """
         Look up a few vital elements in the Yahoo API;
-                return them as a dictionary.
-        In:  tickers has been assigned a string.
-        Out: list of dictionaries, each representing the stats for a
+                return them as Quotes.
+        In:  ticker_str (argument) or, failing that, self.ticker_str.
+        Out: list of Quotes, each representing the stats for a
                 particular ticker.
         """
         stats_wanted = [item for item in self.tag_names
@@ -255,25 +553,108 @@ class StockScraper():
         if missing:
             print("Cannot identify tag(s): {}".format(', '.join(missing)))
         # get Yahoo data as list of lists
-        url = ('http://finance.yahoo.com/d/quotes.csv?s={0}&f={1}'.
-                format(self.ticker_str, stats))
+        if ticker_str is None:
+            ticker_str = self.ticker_str
+        url = self.quote_url.format(ticker_str, stats)
+        retrieved_contents = self.process_url(url, '\r\n', ticker_str)
+        if not retrieved_contents:
+            return []
         # Below added [0].split('\n') because of apparent change in format.
         # 20150313.
-        retrieved_contents = self.process_url(url, '\r\n')[0].split('\n')
+        with metrics.timer('parse', endpoint='quotes'):
+            return self.parse_quotes(retrieved_contents[0])
+
+    def parse_quotes(self, retrieved_contents):
+        """
+        In:  quote response from the Yahoo API, decoded.
+        Out: list of Quotes, each representing the stats for a particular
+                ticker.
+        """
+        retrieved_contents = retrieved_contents.split('\n')
+        make_quote = records.quote_maker(self.tag_names)
         #
-        # Prepare dictionary to be returned
+        # Prepare list to be returned
         full_data = []
         for item in retrieved_contents:
             one_row = item.split(',')
-            # Next: build dictionary for each "item"
-            full_data.append({list_item: row_item.strip('"')
-                    for list_item, row_item in zip(self.tag_names, one_row)})
+            # Next: build Quote for each "item"
+            full_data.append(make_quote([row_item.strip('"')
+                    for row_item in one_row]))
         return full_data
 
+    def store_prices(self, connection, data, today, columns):
+        """
+        In:  open connection; list of Quotes, as from lookup; date of lookup;
+                 tuple of percent changes and their mask, as from
+                 percent_batch.
+        Out: Stores them to prices in one transaction; returns number stored.
+                 A snapshot already stored for the same share, lookup date
+                 and trade date is not stored again.
+        """
+        percent, valid = columns
+        data = [(quote, percent_i if valid_i else None)
+                for quote, percent_i, valid_i in zip(data, percent, valid)
+                if quote.get('Symbol')]
+        if not data:
+            return 0
+        symbols = [quote.symbol for quote, percent_i in data]
+        with metrics.timer('db_insert', table='prices'), connection:
+            connection.executemany('''INSERT OR IGNORE INTO shares (ticker)
+                    VALUES (?)''', ((symbol, ) for symbol in symbols))
+            # No more than yahoo_limit symbols, well within SQLite's limit on
+            #     the number of parameters.
+            share_ids = dict(connection.execute(
+                    '''SELECT ticker, id FROM shares WHERE ticker IN ({0})'''.
+                    format(','.join('?' * len(symbols))), symbols))
+            cursor = connection.executemany('''INSERT OR IGNORE INTO prices (
+                    idSharesFK, lookupdate, tradedate, lasttrade_value,
+                    chg_lastrep, pc_chg_lastrep, div_per_shr)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                    [(share_ids[quote.symbol], today.isoformat(),
+                    quote_date(quote.last_trade_date),
+                    quote_float(quote.last_trade),
+                    quote_float(quote.change),
+                    percent_i,
+                    quote_float(quote.dividend_share))
+                    for quote, percent_i in data])
+        return cursor.rowcount
+
+    def percent_batch(self, data):
+        """
+        In:  list of Quotes, as from lookup.
+        Out: tuple of array of percent changes, computed for the whole batch
+                 at once, and mask, 1 where there is one.
+        """
+        percent, valid, both_zero, no_base = (
+                quote_batch.percent_change_column(
+                [quote.change for quote in data],
+                [quote.last_trade for quote in data]))
+        for i in sorted(both_zero + no_base):
+            if percent[i] == 0.0:
+                print(' ***They were both zero.')
+            else:
+                print(' *** Late trade', float(data[i].last_trade),
+                        'Change', float(data[i].change))
+        return percent, valid
+
+    def format_batch(self, data, columns=None):
+        """
+        In:  list of Quotes, as from lookup; optional tuple of percent
+                 changes and mask, as from percent_batch, if already made.
+        Out: Same list, each Quote edited as by format_data, but with
+                 percent change computed for the whole batch at once.
+        """
+        if columns is None:
+            columns = self.percent_batch(data)
+        for quote, pc_chg in zip(data,
+                quote_batch.format_percent_column(*columns)):
+            quote.percent_change = pc_chg
+        return data
+
     def format_data(self, tckr_stats):
         """
-        In:  Dictionary of ticker:statistics
-        Out: Same dictionary, but with formatting edited.
+        In:  Quote (or dictionary of ticker:statistics)
+        Out: Same Quote, but with formatting edited.
         """
         # Add percent change information
         # Note that this will eventually be change from last lookup
@@ -306,12 +687,91 @@ class StockScraper():
         return tckr_stats
 
 ##################
-def main(filename='stock_list.txt', verbose=False):
+def quote_float(value):
+    """
+    In:  value from the Yahoo API, such as '12.50', '+0.25' or 'N/A'.
+    Out: float, or None if there is no number.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def quote_date(value):
+    """
+    In:  date from the Yahoo API, such as '3/13/2015', or 'N/A'.
+    Out: ISO 8601 date string, or None.
+    """
+    try:
+        return datetime.datetime.strptime(value, '%m/%d/%Y').strftime(
+                '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+def migrate_db(connection):
+    """
+    In:  open connection to hl.db.
+    Out: Creates the tables if the db is new; runs migrate_db.sqlscript if the
+             db predates its indexes or tables, and adds shares.active if
+             the db predates that.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    if not connection.execute('''SELECT name FROM sqlite_master
+            WHERE type='table' AND name='headlines' ''').fetchall():
+        # Before WAL, which would fix the db's auto_vacuum setting first.
+        with open(os.path.join(here, 'create_table.sqlscript'), 'r') as f:
+            connection.executescript(f.read())
+    # Lets readers (db_to_latex) work while prices and headlines are written;
+    #   the setting is kept in the db file.
+    connection.execute('PRAGMA journal_mode=WAL')
+    if 'active' not in [row[1] for row in connection.execute(
+            'PRAGMA table_info(shares)')]:
+        with connection:
+            connection.execute('''ALTER TABLE shares
+                    ADD COLUMN active INTEGER NOT NULL DEFAULT 1''')
+    # The script itself is idempotent, but de-duplication scans the whole
+    #   headlines table, so skip it once everything is in place.
+    names = {row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master")}
+    if MIGRATION_OBJECTS <= names:
+        return
+    with open(os.path.join(here, 'migrate_db.sqlscript'), 'r') as f:
+        connection.executescript(f.read())
+
+def main(filename='stock_list.txt', verbose=False, workers=DEFAULT_WORKERS,
+        parse_workers=0, archive_dir=archive.ARCHIVE_DIR,
+        cache_file=http_cache.CACHE_FILE, schedule=False, request_budget=None,
+        daemon=False, metrics_dir=None):
     """
-    Look up vital stock data and headlines on Yahoo
-    and store to database.
+    Look up vital stock data and headlines on Yahoo for the tickers in
+    filename, a list in data/, or in all of a list of such names,
+    and store to database; keep what was downloaded in archive_dir,
+    and cache responses in cache_file, unless they are None.
+    With schedule set, also fetch headlines, but only for tickers due for
+    refreshing, at most request_budget of them. With daemon set, keep
+    running and do so every hour, with at most request_budget pages a cycle. With metrics_dir set, write timings and counts there
+    (stockscrape.json and stockscrape.prom) at the end of the run.
+    workers is the number of quote batches and headline pages requested at
+    once; 1 makes every request wait for the one before.
     """
-    S = StockScraper(verbose, filename)
+    if metrics_dir is not None:
+        metrics.configure()
+    if archive_dir is not None:
+        response_archive = archive.Archive(archive_dir)
+    else:
+        response_archive = None
+    if cache_file is not None:
+        cache = http_cache.HTTPCache(cache_file)
+    else:
+        cache = None
+    S = StockScraper(verbose, filename, workers, parse_workers=parse_workers,
+            archive=response_archive, cache=cache)
+    S.schedule = schedule
+    S.request_budget = request_budget
+    S.metrics_dir = metrics_dir
+    if daemon:
+        S.run_daemon(request_budget=request_budget)
+        return
     ################################
     S.api_results = S.get_api_results()
     ################################
@@ -319,11 +779,30 @@ def main(filename='stock_list.txt', verbose=False):
     S.process_tickers()
     ################################
     # 2. Stock news
-    # STOPPED WORKING in 2016
-#    S.process_news()
+    # STOPPED WORKING in 2016; only the scheduled refresh asks for it.
+    if schedule:
+        S.process_news()
     ################################
     # 3. Report to output
 #    print('\n\nFinished headlines.')
+    if cache is not None:
+        S.debug_print('Cache:', cache.stats())
+        cache.close()
+    if metrics_dir is not None:
+        metrics.write(metrics_dir)
 
 if __name__ == '__main__':
-    main(verbose='-v' in sys.argv)
+    # Any number of lists in data/, whose tickers are all fetched together.
+    filenames = [arg for arg in sys.argv[1:] if not arg.startswith('-')]
+    # --workers=N: requests at once, for a run or for each daemon cycle.
+    workers = [int(arg.split('=', 1)[1]) for arg in sys.argv[1:]
+            if arg.startswith('--workers=')]
+    # --budget=N: most headline pages requested, per run or daemon cycle.
+    budget = [int(arg.split('=', 1)[1]) for arg in sys.argv[1:]
+            if arg.startswith('--budget=')]
+    main(filenames or 'stock_list.txt', verbose='-v' in sys.argv,
+            workers=workers[-1] if workers else DEFAULT_WORKERS,
+            schedule='--schedule' in sys.argv,
+            request_budget=budget[-1] if budget else None,
+            daemon='--daemon' in sys.argv,
+            metrics_dir='metrics' if '--metrics' in sys.argv else None)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# http_cache.py
+# 20261018
+
+"""
+Persistent cache of HTTP responses, keyed by URL, so that a rerun on the
+same day fetches (almost) nothing again. Entries are fresh for a time that
+depends on the kind of response; stale entries are revalidated with
+If-None-Match/If-Modified-Since when the server supplied ETag/Last-Modified;
+the least recently used entries are evicted when the cache exceeds its size.
+"""
+
+import sqlite3 as SQ
+import threading
+import time as T
+import urllib.error as UE
+import urllib.request as UR
+import http_client
+
+CACHE_FILE = 'http_cache.db'
+# Seconds for which a response is used without asking the server again.
+DEFAULT_TTLS = {'quotes': 15 * 60, 'page': 6 * 60 * 60}
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+class HTTPCache():
+    def __init__(self, path=CACHE_FILE, ttls=None, max_bytes=DEFAULT_MAX_BYTES,
+            timeout=None):
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        # Counters, for reporting.
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evicted = 0
+        self.lock = threading.Lock()
+        self.connection = SQ.connect(path, check_same_thread=False)
+        with self.connection:
+            columns = [row[1] for row in self.connection.execute(
+                    'PRAGMA table_info(responses)')]
+            if 'body' in columns:
+                # Made before bodies were kept apart; only a cache, so
+                #     start again.
+                self.connection.execute('DROP TABLE responses')
+            # Bodies are kept apart from what eviction reads, so that
+            #     choosing what to evict never reads them.
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS responses(
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    size INTEGER NOT NULL)''')
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS bodies(
+                    url TEXT PRIMARY KEY,
+                    body BLOB NOT NULL)''')
+            self.connection.execute('''CREATE INDEX IF NOT EXISTS
+                    responses_accessed ON responses(accessed)''')
+        # Bytes of all bodies, kept up to date as entries come and go.
+        self.total = self.connection.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def fetch(self, url, kind, urlopen=None):
+        """
+        In:  url, kind of response (a key of self.ttls), optional function
+                 to make the request over the network (default self.urlopen).
+        Out: tuple of body (bytes) and whether it was downloaded afresh.
+             Raises urllib.error.URLError as urlopen does.
+        """
+        now = T.time()
+        with self.lock:
+            row = self.connection.execute('''SELECT b.body, r.etag,
+                    r.last_modified, r.fetched
+                    FROM responses AS r JOIN bodies AS b ON b.url = r.url
+                    WHERE r.url=?''', (url, )).fetchone()
+            if row is not None and now - row[3] < self.ttls[kind]:
+                self.hits += 1
+                with self.connection:
+                    self.connection.execute('''UPDATE responses SET accessed=?
+                            WHERE url=?''', (now, url))
+                return row[0], False
+        headers = {}
+        if row is not None:
+            if row[1]:
+                headers['If-None-Match'] = row[1]
+            if row[2]:
+                headers['If-Modified-Since'] = row[2]
+        try:
+            if urlopen is None:
+                urlopen = self.urlopen
+            response = urlopen(UR.Request(url, headers=headers))
+            body = response.read()
+        except UE.HTTPError as e:
+            if e.code != 304 or row is None:
+                raise
+            # Not modified: what we have is good for another TTL.
+            with self.lock:
+                self.hits += 1
+                self.revalidated += 1
+                with self.connection:
+                    self.connection.execute('''UPDATE responses
+                            SET fetched=?, accessed=? WHERE url=?''',
+                            (now, now, url))
+            return row[0], False
+        with self.lock:
+            self.misses += 1
+            with self.connection:
+                # A replaced entry's bytes no longer count.
+                old = self.connection.execute('''SELECT size FROM responses
+                        WHERE url=?''', (url, )).fetchone()
+                self.connection.execute('''INSERT OR REPLACE INTO responses
+                        (url, etag, last_modified, fetched, accessed, size)
+                        VALUES (?, ?, ?, ?, ?, ?)''',
+                        (url, response.headers.get('ETag'),
+                        response.headers.get('Last-Modified'), now, now,
+                        len(body)))
+                self.connection.execute('''INSERT OR REPLACE INTO bodies
+                        (url, body) VALUES (?, ?)''', (url, body))
+                self.total += len(body) - (old[0] if old else 0)
+                if self.total > self.max_bytes:
+                    self.evict()
+        return body, True
+
+    def urlopen(self, request):
+        """Open request through the shared keep-alive client."""
+        return http_client.urlopen(request, self.timeout)
+
+    def evict(self):
+        """Remove least recently used entries until within self.max_bytes."""
+        if self.total <= self.max_bytes:
+            return
+        cursor = self.connection.execute(
+                'SELECT url, size FROM responses ORDER BY accessed')
+        doomed = []
+        for url, size in cursor:
+            if self.total <= self.max_bytes:
+                break
+            doomed.append((url, ))
+            self.total -= size
+        self.connection.executemany('DELETE FROM responses WHERE url=?',
+                doomed)
+        self.connection.executemany('DELETE FROM bodies WHERE url=?', doomed)
+        self.evicted += len(doomed)
+
+    def stats(self):
+        """Out: dictionary of the counters."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'revalidated': self.revalidated, 'evicted': self.evicted}
+
+    def close(self):
+        self.connection.close()
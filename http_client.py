@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# http_client.py
+# 20261018
+
+"""
+Keep-alive HTTP client used by all the scripts in place of
+urllib.request.urlopen: connections to each host are pooled and reused,
+and responses are requested gzipped. Errors are raised as urllib.error's
+URLError and HTTPError, so callers handle them exactly as before.
+"""
+
+import gzip
+import http.client
+import queue
+import threading
+import urllib.error as UE
+import urllib.parse as UP
+import urllib.request as UR
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_TIMEOUT = 30
+REDIRECTS = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 5
+
+class Response():
+    """Just enough of what urlopen returns: read(), status/code, headers."""
+    def __init__(self, url, status, reason, headers, body):
+        self.url = url
+        self.status = status
+        self.code = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def read(self):
+        return self.body
+
+    def getcode(self):
+        return self.status
+
+class HTTPClient():
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        # Number of idle connections kept open per host.
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.pools = {}
+        self.lock = threading.Lock()
+        # Counters, for reporting.
+        self.connections_opened = 0
+        self.requests = 0
+
+    def pool(self, key):
+        with self.lock:
+            if key not in self.pools:
+                self.pools[key] = queue.LifoQueue(self.pool_size)
+            return self.pools[key]
+
+    def connect(self, key, timeout):
+        scheme, host, port = key
+        if scheme == 'https':
+            connection = http.client.HTTPSConnection(host, port,
+                    timeout=timeout)
+        else:
+            connection = http.client.HTTPConnection(host, port,
+                    timeout=timeout)
+        with self.lock:
+            self.connections_opened += 1
+        return connection
+
+    def urlopen(self, url, timeout=None):
+        """
+        In:  url (string or urllib.request.Request), optional timeout.
+        Out: Response, with the body already read and decompressed.
+             Raises HTTPError for status other than 2xx after redirects,
+             URLError if the host cannot be reached.
+        """
+        if isinstance(url, UR.Request):
+            headers = dict(url.header_items())
+            url = url.full_url
+        else:
+            headers = {}
+        if timeout is None:
+            timeout = self.timeout
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self.request(url, headers, timeout)
+            if response.status not in REDIRECTS:
+                break
+            url = UP.urljoin(url, response.headers.get('Location', ''))
+        if not 200 <= response.status < 300:
+            raise UE.HTTPError(url, response.status, response.reason,
+                    response.headers, None)
+        return response
+
+    def request(self, url, headers, timeout):
+        """One GET request over a pooled connection, retried once if the
+        reused connection turns out to have been closed by the server."""
+        parts = UP.urlsplit(url)
+        scheme = parts.scheme or 'http'
+        port = parts.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        headers = dict(headers)
+        headers.setdefault('Accept-Encoding', 'gzip')
+        headers.setdefault('User-Agent', 'Python-urllib')
+        pool = self.pool(key)
+        for attempt in range(2):
+            try:
+                connection = pool.get_nowait()
+                reused = True
+            except queue.Empty:
+                connection = self.connect(key, timeout)
+                reused = False
+            try:
+                connection.request('GET', path, headers=headers)
+                raw = connection.getresponse()
+                body = raw.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError,
+                    BrokenPipeError) as e:
+                connection.close()
+                if reused and attempt == 0:
+                    continue
+                raise UE.URLError(e)
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                raise UE.URLError(e)
+            break
+        with self.lock:
+            self.requests += 1
+        if raw.will_close:
+            connection.close()
+        else:
+            try:
+                pool.put_nowait(connection)
+            except queue.Full:
+                connection.close()
+        if raw.getheader('Content-Encoding', '').lower() == 'gzip':
+            body = gzip.decompress(body)
+        return Response(url, raw.status, raw.reason, raw.headers, body)
+
+    def close(self):
+        """Close all idle connections."""
+        with self.lock:
+            pools = list(self.pools.values())
+        for pool in pools:
+            while True:
+                try:
+                    pool.get_nowait().close()
+                except queue.Empty:
+                    break
+
+DEFAULT_CLIENT = HTTPClient()
+
+def configure(pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+    """Replace the shared client with one of the given pool size/timeout."""
+    global DEFAULT_CLIENT
+    DEFAULT_CLIENT.close()
+    DEFAULT_CLIENT = HTTPClient(pool_size, timeout)
+    return DEFAULT_CLIENT
+
+def urlopen(url, timeout=None):
+    """Drop-in for urllib.request.urlopen, through the shared client."""
+    return DEFAULT_CLIENT.urlopen(url, timeout)
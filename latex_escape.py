@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# latex_escape.py
+# 20261018
+
+"""Escape scraped text for LaTeX; shared by the report and length scripts."""
+
+import functools
+import re
+
+# Single-pass equivalent of the replacements originally applied one after
+#     another with str.replace (kept in tests/test_latex_escape.py, which
+#     checks the two agree). Because they were applied in turn, some of
+#     them act on the output of earlier ones:
+#     '&amp;gt;' becomes '\&gt;' and then '\>'; and every '&' gets a backslash
+#     which r'\\&' then removes again if the '&' already had one.
+# HTML forms probably rare in Beautiful Soup output, but retained in case.
+_SINGLE_PASS = {
+        '&amp;gt;': r'\>',
+        '&amp;lt;': r'\<',
+        '&amp;': r'\&',
+        '&gt;': '>',
+        '&lt;': '<',
+        '&': r'\&',
+        '$': r'\$',
+        '%': r'\%',
+        '#': r'\#',
+        ' "': ' ``',
+        " '": " `",
+        '"': "''",
+        '\xa0': ' '}
+# Longer keys come first so that they win over their prefixes; a bare '&'
+#     already preceded by a backslash is left alone.
+_PATTERN = re.compile('|'.join(
+        r'(?<!\\)&' if key == '&' else re.escape(key)
+        for key in sorted(_SINGLE_PASS, key=len, reverse=True)))
+
+# Separator for escape_all; it takes part in none of the replacements.
+_SEPARATOR = '\x00'
+
+def _replace(match):
+    return _SINGLE_PASS[match.group()]
+
+@functools.lru_cache(maxsize=4096)
+def escape_for_latex(a_string):
+    """Perform simple text replacements for LaTeX compatibility."""
+    # Next: add curly quotes to this list?
+    return _PATTERN.sub(_replace, a_string)
+
+def escape_all(strings):
+    """
+    In:  list of strings, such as all headlines for a report.
+    Out: list of the same strings escaped as by escape_for_latex.
+    """
+    strings = list(strings)
+    if not strings:
+        return []
+    joined = _SEPARATOR.join(strings)
+    # Should any string contain the separator itself, escape one at a time.
+    if joined.count(_SEPARATOR) != len(strings) - 1:
+        return [escape_for_latex(a_string) for a_string in strings]
+    return _PATTERN.sub(_replace, joined).split(_SEPARATOR)
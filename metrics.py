@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# metrics.py
+# 20261018
+
+"""
+Counters, timers and latency histograms for a run, written at the end as a
+JSON summary and as a Prometheus text file (for node_exporter's textfile
+collector). Disabled by default; while disabled, every call returns at once.
+
+Use through the shared registry:
+    with metrics.timer('fetch', endpoint='page'):
+        ...
+    metrics.count('headlines_new', added)
+"""
+
+import bisect
+import json
+import os
+import threading
+import time as T
+
+# Upper bounds (seconds) of the histogram buckets; the last is +Inf.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+        float('inf'))
+PREFIX = 'stockscrape_'
+
+class Histogram():
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def summary(self):
+        return {'count': self.count, 'sum': self.sum, 'min': self.min,
+                'max': self.max, 'mean': self.sum / self.count
+                if self.count else None}
+
+class Timer():
+    """Context manager adding the time spent inside it to a histogram."""
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = T.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.name, T.perf_counter() - self.start,
+                **self.labels)
+        return False
+
+class NullTimer():
+    """Stands in for Timer while metrics are disabled."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_TIMER = NullTimer()
+
+class Metrics():
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.started = T.time()
+
+    def count(self, name, amount=1, **labels):
+        """Add amount to the counter name (with labels, if any)."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """Add value (seconds) to the histogram name."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    def timer(self, name, **labels):
+        """Out: context manager timing its body into the histogram name."""
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, name, labels)
+
+    def summary(self):
+        """Out: dictionary of everything recorded, for JSON."""
+        def label_str(labels):
+            return ','.join('{0}={1}'.format(*label) for label in labels)
+        with self.lock:
+            counters = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                counters.setdefault(name, {})[label_str(labels)] = value
+            timers = {}
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                timers.setdefault(name, {})[label_str(labels)] = (
+                        histogram.summary())
+        return {'started': self.started, 'elapsed': T.time() - self.started,
+                'counters': counters, 'timers': timers}
+
+    def prometheus(self):
+        """Out: everything recorded, in the Prometheus text format."""
+        def label_str(labels, extra=()):
+            labels = list(labels) + list(extra)
+            if not labels:
+                return ''
+            return '{' + ','.join('{0}="{1}"'.format(key, value)
+                    for key, value in labels) + '}'
+        lines = []
+        with self.lock:
+            names = sorted({name for name, labels in self.counters})
+            for name in names:
+                lines.append('# TYPE {0}{1}_total counter'.format(PREFIX, name))
+                for (other, labels), value in sorted(self.counters.items()):
+                    if other == name:
+                        lines.append('{0}{1}_total{2} {3}'.format(PREFIX, name,
+                                label_str(labels), value))
+            names = sorted({name for name, labels in self.histograms})
+            for name in names:
+                metric = PREFIX + name + '_seconds'
+                lines.append('# TYPE {0} histogram'.format(metric))
+                for (other, labels), histogram in sorted(
+                        self.histograms.items()):
+                    if other != name:
+                        continue
+                    cumulative = 0
+                    for bound, bucket in zip(BUCKETS, histogram.counts):
+                        cumulative += bucket
+                        lines.append('{0}_bucket{1} {2}'.format(metric,
+                                label_str(labels, [('le', '+Inf'
+                                if bound == float('inf') else repr(bound))]),
+                                cumulative))
+                    lines.append('{0}_sum{1} {2!r}'.format(metric,
+                            label_str(labels), histogram.sum))
+                    lines.append('{0}_count{1} {2}'.format(metric,
+                            label_str(labels), histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, directory, name='stockscrape'):
+        """
+        In:  directory, base name of the files.
+        Out: Writes name.json and name.prom there, each replaced whole so
+                 that nothing reads a half-written file; returns their paths.
+        """
+        if not self.enabled:
+            return []
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for extension, text in (('.json', json.dumps(self.summary(),
+                indent=1)), ('.prom', self.prometheus())):
+            path = os.path.join(directory, name + extension)
+            with open(path + '.tmp', 'w') as f:
+                f.write(text)
+            os.replace(path + '.tmp', path)
+            paths.append(path)
+        return paths
+
+DEFAULT_METRICS = Metrics(enabled=False)
+
+def configure(enabled=True):
+    """Replace the shared registry with a new, empty one."""
+    global DEFAULT_METRICS
+    DEFAULT_METRICS = Metrics(enabled)
+    return DEFAULT_METRICS
+
+def count(name, amount=1, **labels):
+    DEFAULT_METRICS.count(name, amount, **labels)
+
+def observe(name, value, **labels):
+    DEFAULT_METRICS.observe(name, value, **labels)
+
+def timer(name, **labels):
+    return DEFAULT_METRICS.timer(name, **labels)
+
+def write(directory, name='stockscrape'):
+    return DEFAULT_METRICS.write(directory, name)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# news_parser.py
+# 20261018
+
+"""Parse Yahoo headline pages (layout as of 2016) into lists of headlines."""
+
+import re
+import time
+import bs4
+from records import Headline
+
+# Only <li> elements hold headlines, so only they are built into the tree.
+LI_STRAINER = bs4.SoupStrainer('li')
+# Regexes used for every headline, compiled once.
+TRACKER_RE = re.compile(r'http.+?\*')
+CITE_TAG_RE = re.compile(r'<\/?cite>')
+AT_RE = re.compile(r'^at ')
+PARENS_RE = re.compile(r'\(|\)')
+
+def make_soup(retrieved_contents):
+    """
+    In:  page as retrieved (bytes or string).
+    Out: BS object holding only the page's <li> elements.
+    """
+    return bs4.BeautifulSoup(retrieved_contents, parse_only=LI_STRAINER)
+
+def parse_headlines(webpage, today=None):
+    """
+    In:  webpage formatted by BS; optional date the page was retrieved,
+             if not today (for pages replayed from the archive).
+    Out; list of Headlines, each (headline, link, source, date)
+    """
+    headline_list = []
+    if webpage:
+        for item in webpage.find_all('li'):
+            try:
+                # Headline
+                headline = item.a.text
+                #
+                # Link
+                link = item.a.attrs['href']
+                # many URLs have Yahoo-tracking prefix, which we strip
+                link = TRACKER_RE.sub('', link)
+                #
+                # Source, from which the date must be removed
+                cite = item.cite
+                if cite is None:
+                    continue
+                span = item.span
+                source = str(cite).replace('\xa0' + str(span), '')
+                # replace <cite> and </cite> tags
+                source = CITE_TAG_RE.sub('', source)
+                # if Yahoo is supplying a link with a tracker, remove ``at ''
+                source = AT_RE.sub('', source)
+                #
+                # Date
+                newsdate = span.text
+                # replace parens
+                newsdate = PARENS_RE.sub('', newsdate)
+                # If no date is given (string i.e., contains 'AM' or 'PM'),
+                #   then we supply current local date.
+                if 'AM' in newsdate or 'PM' in newsdate:
+                    if today is None:
+                        newsdate = time.strftime('%a, %b %d', time.localtime())
+                    else:
+                        newsdate = today.strftime('%a, %b %d')
+                #
+                # Done
+                headline_list.append(Headline(headline, link, source,
+                        newsdate))
+            except Exception as e:
+                continue
+    return headline_list
+
+def parse_page(retrieved_contents, today=None):
+    """
+    In:  page as retrieved (bytes or string), or None if retrieval failed;
+             optional date the page was retrieved, if not today.
+    Out: list of Headlines, as from parse_headlines. Module-level, so that it can
+             be sent to a process pool.
+    """
+    if not retrieved_contents:
+        return []
+    webpage = make_soup(retrieved_contents)
+    try:
+        return parse_headlines(webpage, today)
+    finally:
+        # The tree is full of reference cycles; taking it apart now frees
+        #     it at once rather than at the next full garbage collection.
+        webpage.decompose()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# pipeline.py
+# 20261018
+
+"""
+Stages of threads connected by bounded queues. Each stage takes items from
+the queue before it and puts what it makes of them on the queue after it;
+a full queue holds up the stage before it, so no more than a few items per
+stage are ever in memory, however many go through. How long each stage
+spent working, and waiting on its neighbours, shows which one is the
+bottleneck.
+"""
+
+import queue
+import threading
+import time as T
+
+# Put on a queue after the last item.
+DONE = object()
+# How often threads blocked on a queue check whether the pipeline stopped.
+POLL = 0.1
+
+class PipelineStopped(Exception):
+    pass
+
+class Stage():
+    def __init__(self, name, function, threads=1):
+        """
+        In:  name, for reports; function from one item to the next stage's
+                 item; number of threads running it.
+        """
+        self.name = name
+        self.function = function
+        self.threads = threads
+        self.items = 0
+        # Thread-seconds working, waiting for items and waiting for room
+        #     in the next queue.
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, busy=0.0, starved=0.0, blocked=0.0, items=0):
+        with self.lock:
+            self.busy += busy
+            self.starved += starved
+            self.blocked += blocked
+            self.items += items
+
+    def utilization(self, elapsed):
+        """Out: fraction of its threads' time the stage spent working."""
+        if not elapsed:
+            return 0.0
+        return self.busy / (self.threads * elapsed)
+
+    def report(self, elapsed):
+        """Out: dictionary of what the stage did in elapsed seconds."""
+        return {'stage': self.name, 'threads': self.threads,
+                'items': self.items, 'busy': self.busy,
+                'starved': self.starved, 'blocked': self.blocked,
+                'per_second': self.items / elapsed if elapsed else 0.0,
+                # Items per second it could handle if never kept waiting.
+                'capacity': self.items * self.threads / self.busy
+                if self.busy else None,
+                'utilization': self.utilization(elapsed)}
+
+class Pipeline():
+    def __init__(self, stages, queue_size=16):
+        """
+        In:  list of Stages, in order; number of items each queue between
+                 them can hold.
+        """
+        self.stages = stages
+        self.queues = [queue.Queue(queue_size) for _ in range(len(stages) + 1)]
+        self.stopped = threading.Event()
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.live = [stage.threads for stage in stages]
+        self.lock = threading.Lock()
+
+    def put(self, q, item):
+        """Put item on q, unless the pipeline stops first."""
+        while True:
+            if self.stopped.is_set():
+                raise PipelineStopped()
+            try:
+                q.put(item, timeout=POLL)
+                return
+            except queue.Full:
+                pass
+
+    def get(self, q):
+        """Out: next item from q, unless the pipeline stops first."""
+        while True:
+            if self.stopped.is_set():
+                raise PipelineStopped()
+            try:
+                return q.get(timeout=POLL)
+            except queue.Empty:
+                pass
+
+    def feed(self, items):
+        try:
+            for item in items:
+                self.put(self.queues[0], item)
+            self.put(self.queues[0], DONE)
+        except PipelineStopped:
+            pass
+        except BaseException as e:
+            self.fail(e)
+
+    def work(self, index):
+        stage = self.stages[index]
+        source = self.queues[index]
+        destination = self.queues[index + 1]
+        try:
+            while True:
+                start = T.perf_counter()
+                item = self.get(source)
+                got = T.perf_counter()
+                if item is DONE:
+                    stage.record(starved=got - start)
+                    # Leave it for this stage's other threads; the last
+                    #     one to finish passes it on.
+                    self.put(source, DONE)
+                    with self.lock:
+                        self.live[index] -= 1
+                        last = self.live[index] == 0
+                    if last:
+                        self.put(destination, DONE)
+                    return
+                result = stage.function(item)
+                done = T.perf_counter()
+                self.put(destination, result)
+                stage.record(busy=done - got, starved=got - start,
+                        blocked=T.perf_counter() - done, items=1)
+        except PipelineStopped:
+            pass
+        except BaseException as e:
+            self.fail(e)
+
+    def fail(self, error):
+        with self.lock:
+            if self.error is None:
+                self.error = error
+        self.stopped.set()
+
+    def run(self, items):
+        """
+        In:  iterable of items for the first stage.
+        Out: generator of what the last stage makes of them, in order of
+                 completion. Closing it early stops the pipeline; an
+                 exception in any stage is raised here.
+        """
+        self.started = T.perf_counter()
+        threads = [threading.Thread(target=self.feed, args=(items, ),
+                daemon=True)]
+        for index, stage in enumerate(self.stages):
+            threads.extend(threading.Thread(target=self.work, args=(index, ),
+                    daemon=True) for _ in range(stage.threads))
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                try:
+                    item = self.get(self.queues[-1])
+                except PipelineStopped:
+                    break
+                if item is DONE:
+                    break
+                yield item
+        finally:
+            self.finished = T.perf_counter()
+            self.stopped.set()
+            for thread in threads:
+                thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or T.perf_counter()) - self.started
+
+    def report(self, extra=()):
+        """
+        In:  optional further Stages run outside the pipeline (such as the
+                 one consuming its output).
+        Out: list of dictionaries, one per stage, as from Stage.report.
+        """
+        elapsed = self.elapsed()
+        return [stage.report(elapsed) for stage in list(self.stages) +
+                list(extra)]
+
+def consume(items, stage):
+    """
+    In:  iterable, such as the output of Pipeline.run; Stage standing for
+             the code consuming it.
+    Out: the same items; time spent waiting for each is counted as the
+             stage being starved, time until the next is asked for as busy.
+    """
+    mark = T.perf_counter()
+    for item in items:
+        got = T.perf_counter()
+        stage.record(starved=got - mark)
+        yield item
+        mark = T.perf_counter()
+        stage.record(busy=mark - got, items=1)
+
+def format_report(reports):
+    """Out: lines of text for a report, naming the busiest stage."""
+    lines = []
+    for report in reports:
+        lines.append('{stage:>6s}: {items:6d} items, {per_second:8.1f}/s, '
+                '{threads:2d} thread(s) {utilization:4.0%} busy; '
+                'waited {starved:7.2f} s for input, {blocked:7.2f} s for '
+                'room'.format(**report))
+    if reports:
+        busiest = max(reports, key=lambda report: report['utilization'])
+        lines.append('Bottleneck: {0}.'.format(busiest['stage']))
+    return lines
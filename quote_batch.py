@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# quote_batch.py
+# 20261018
+
+"""
+Percent change for a whole quote response at once. Each column is parsed
+once into an array of floats, with a mask for the rows where Yahoo gave no
+number ('N/A'); formatting is left until output.
+"""
+
+from array import array
+
+NA = 'N/A'
+
+def float_column(values, valid):
+    """
+    In:  column of strings from the Yahoo API; mask of rows to parse.
+    Out: array of floats; masked-out rows are 0.0.
+    """
+    return array('d', [float(value) if ok else 0.0
+            for value, ok in zip(values, valid)])
+
+def percent_change_column(changes, last_trades):
+    """
+    In:  'Change' and 'Last trade' columns, as strings from the Yahoo API.
+    Out: array of percent changes; mask, 1 where there is one; list of rows
+             where both values were zero (percent change 0.0) and list of
+             rows where the change was the whole last trade (100.0).
+    """
+    valid = bytearray(change != NA and last != NA
+            for change, last in zip(changes, last_trades))
+    change = float_column(changes, valid)
+    last = float_column(last_trades, valid)
+    base = [last_i - change_i for last_i, change_i in zip(last, change)]
+    # Masked-out rows have no base either, and get 0.0.
+    percent = array('d', [change_i * 100 / base_i if base_i else 0.0
+            for change_i, base_i in zip(change, base)])
+    both_zero = []
+    no_base = []
+    for i in [i for i, base_i in enumerate(base) if not base_i]:
+        if not valid[i]:
+            continue
+        if last[i] == 0.0 and change[i] == 0.0:
+            both_zero.append(i)
+        else:
+            percent[i] = 100.0
+            no_base.append(i)
+    return percent, valid, both_zero, no_base
+
+def format_percent_column(percent, valid, percent_sign='%'):
+    """
+    In:  array of percent changes and mask, as from percent_change_column;
+             optional percent sign (LaTeX needs '\\%').
+    Out: list of strings such as '+1.25%', '-0.50%' or 'N/A'.
+    """
+    # format_data adds '+' where there is no '-', as '%+' does; its '0'
+    #   case never happens, since '.2f' always gives two decimals.
+    return ['%+.2f' % value + percent_sign if ok else NA
+            for value, ok in zip(percent, valid)]
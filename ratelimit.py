@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# ratelimit.py
+# 20261018
+
+"""
+Politeness and resilience for requests to one endpoint: a token bucket
+limits the request rate, failures are retried after exponentially growing,
+jittered delays, and a circuit breaker stops requests altogether for a while
+once an endpoint keeps failing.
+"""
+
+import random
+import threading
+import time as T
+import urllib.error as UE
+
+# HTTP statuses that mean "slow down" rather than "broken".
+THROTTLED = {429, 503}
+
+class TokenBucket():
+    def __init__(self, rate, capacity=None, clock=T.monotonic, sleep=T.sleep):
+        """
+        In:  rate (tokens per second), capacity (largest burst; default one
+                 second's worth), optional clock and sleep functions.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until a token is available and take it."""
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity,
+                        self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+class Backoff():
+    def __init__(self, base=1.0, cap=300.0, rng=None):
+        """
+        In:  delay after the first failure (seconds), longest delay.
+        Delays double with each failure in a row, "full jitter": each is drawn
+        uniformly between zero and the nominal delay.
+        """
+        self.base = base
+        self.cap = cap
+        self.rng = rng if rng is not None else random.Random()
+
+    def delay(self, failures):
+        """In: number of failures in a row. Out: seconds to wait."""
+        nominal = min(self.cap, self.base * 2 ** max(0, failures - 1))
+        return self.rng.uniform(0, nominal)
+
+class CircuitOpen(UE.URLError):
+    """Raised instead of making a request while the circuit is open."""
+
+class CircuitBreaker():
+    def __init__(self, threshold=5, reset_after=300.0, clock=T.monotonic):
+        """
+        In:  number of failures in a row that opens the circuit; seconds
+                 after which one trial request is let through (half-open).
+        """
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.clock = clock
+        self.failures = 0
+        self.opened = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Out: whether a request may be made now."""
+        with self.lock:
+            if self.opened is None:
+                return True
+            if not self.trial and self.clock() - self.opened >= self.reset_after:
+                self.trial = True
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened = None
+            self.trial = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.opened = self.clock()
+                self.trial = False
+
+    @property
+    def state(self):
+        if self.opened is None:
+            return 'closed'
+        return 'half-open' if self.trial else 'open'
+
+class Endpoint():
+    """Token bucket, backoff and circuit breaker for one kind of request."""
+    def __init__(self, name, rate, retries=3, backoff=None, breaker=None,
+            sleep=T.sleep):
+        self.name = name
+        self.bucket = TokenBucket(rate, sleep=sleep)
+        self.retries = retries
+        self.backoff = backoff if backoff is not None else Backoff()
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.sleep = sleep
+
+    def call(self, function, *args):
+        """
+        In:  function making one request, and its arguments.
+        Out: what function returns. URLErrors (including HTTP errors that
+                 signal throttling) are retried with backoff; once retries
+                 run out, or while the circuit is open, URLError is raised.
+                 Other HTTP errors are raised at once, and count as the
+                 endpoint answering.
+        """
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                raise CircuitOpen('circuit open for ' + self.name)
+            self.bucket.acquire()
+            try:
+                result = function(*args)
+            except UE.HTTPError as e:
+                if e.code not in THROTTLED:
+                    # Not the endpoint's fault, e.g. 404, or 304 for a cache:
+                    #     it answered, which also ends a half-open trial.
+                    self.breaker.success()
+                    raise
+                self.breaker.failure()
+                error = e
+                wait = self.backoff.delay(attempt + 1)
+                retry_after = e.headers.get('Retry-After') if e.headers else None
+                if retry_after and retry_after.isdigit():
+                    wait = max(wait, float(retry_after))
+            except UE.URLError as e:
+                self.breaker.failure()
+                error = e
+                wait = self.backoff.delay(attempt + 1)
+            else:
+                self.breaker.success()
+                return result
+            if attempt < self.retries:
+                self.sleep(wait)
+        raise error
+
+def default_endpoints(quote_rate=2.0, page_rate=5.0):
+    """Out: dictionary of kind of request: Endpoint, for StockScraper."""
+    return {'quotes': Endpoint('quotes', quote_rate),
+            'page': Endpoint('page', page_rate)}
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# records.py
+# 20261018
+
+"""
+Compact record types for quotes and headlines. A Quote keeps its stats in
+slots rather than in a dictionary of its own, but can still be read and set
+by tag name ('Last trade'), so code written for the dictionaries lookup used
+to return works unchanged.
+"""
+
+import collections
+
+# Tag names, as in StockScraper.tag_names, and the slot each is kept in.
+QUOTE_FIELDS = collections.OrderedDict([
+        ('Symbol', 'symbol'),
+        ('Last trade date', 'last_trade_date'),
+        ('Last trade', 'last_trade'),
+        ('Change', 'change'),
+        ('Percent change', 'percent_change'),
+        ('Dividend/share', 'dividend_share'),
+        ('Dividend pay date', 'dividend_pay_date'),
+        ('Ex-dividend date', 'ex_dividend_date')])
+
+class Quote():
+    """Stats for one ticker, from the Yahoo API."""
+    __slots__ = tuple(QUOTE_FIELDS.values())
+
+    def __init__(self, tag_names=(), values=()):
+        """
+        In:  tag names and values, in the same order; a value without a tag
+                 name, or the other way round, is left out, as zip() does.
+        """
+        for tag_name, value in zip(tag_names, values):
+            setattr(self, QUOTE_FIELDS[tag_name], value)
+
+    def __getitem__(self, tag_name):
+        try:
+            return getattr(self, QUOTE_FIELDS[tag_name])
+        except AttributeError:
+            raise KeyError(tag_name)
+
+    def __setitem__(self, tag_name, value):
+        setattr(self, QUOTE_FIELDS[tag_name], value)
+
+    def __contains__(self, tag_name):
+        return (tag_name in QUOTE_FIELDS and
+                hasattr(self, QUOTE_FIELDS[tag_name]))
+
+    def get(self, tag_name, default=None):
+        return self[tag_name] if tag_name in self else default
+
+    def items(self):
+        """Out: list of (tag name, value) pairs for the stats that are set."""
+        return [(tag_name, getattr(self, slot))
+                for tag_name, slot in QUOTE_FIELDS.items()
+                if hasattr(self, slot)]
+
+    def __eq__(self, other):
+        if isinstance(other, Quote):
+            other = dict(other.items())
+        return dict(self.items()) == other
+
+    def __repr__(self):
+        return 'Quote({0!r})'.format(dict(self.items()))
+
+def quote_maker(tag_names):
+    """
+    In:  tag names, in the order of the values in each row.
+    Out: function from a row of values to a Quote, with the slot names looked
+             up once rather than for every row.
+    """
+    slots = [QUOTE_FIELDS[tag_name] for tag_name in tag_names]
+    # Values such as 'N/A', trade dates and dividends repeat from ticker to
+    #     ticker; the Quotes made by one function share a single copy of each.
+    shared = {}
+    def make_quote(values):
+        quote = Quote()
+        for slot, value in zip(slots, values):
+            setattr(quote, slot, shared.setdefault(value, value))
+        return quote
+    return make_quote
+
+# One headline from a Yahoo headline page.
+Headline = collections.namedtuple('Headline', ['headline', 'link', 'source',
+        'date'])
@@ -0,0 +1,389 @@
+#!/usr/bin/env python
+# retention.py
+# 20261018
+
+"""
+Keep hl.db small: headlines older than the hot window (HOT_DAYS) are moved
+to an archive database per month of their date, and hl.db is then
+vacuumed incrementally and its statistics refreshed. Months wholly older
+than the window are closed: compacted and gzipped, after which they do not
+change, so that a git history of the directory holds each of them once.
+Open months change with every run and are left out of git (.gitignore).
+
+Layout: hl_archive/headlines-YYYY-MM.db for an open month,
+hl_archive/headlines-YYYY-MM.db.gz for a closed one; each has a headlines
+table with the columns (and ids) the rows had in hl.db. hl.db keeps the
+set of tickers with archived headlines in archived_tickers. A headline
+scraped again after it was archived is looked up in its month's archive
+(see archived()) rather than stored anew.
+
+Readers see the archives through sources(), as db_to_latex does:
+    for schema in retention.sources(connection, first_date, last_date):
+        connection.execute('SELECT ... FROM {0}.headlines'.format(schema))
+
+Run after each day's scraping as
+    python retention.py [HOT_DAYS]
+"""
+
+import collections
+import datetime as D
+import gzip
+import os
+import shutil
+import sqlite3 as SQ
+import sys
+import tempfile
+import time as T
+import metrics
+
+ARCHIVE_DIR = 'hl_archive'
+# Days of headlines, counting back from today, kept in hl.db.
+HOT_DAYS = 90
+# Most free pages given back to the file system per run; None for all.
+VACUUM_PAGES = None
+# Most rows looked at per index by ANALYZE; keeps it quick on a big db.
+ANALYSIS_LIMIT = 1000
+# Pages of the full-text index merged per run.
+FTS_MERGE_PAGES = 500
+# Archives are attached under this name, one at a time, since SQLite
+#     attaches only a few databases at once.
+SCHEMA = 'archived'
+COLUMNS = ('id, idSharesFK, ticker, headline, url, source, date, lookupdate, '
+        'lastrepdate')
+MONTH_SCHEMA = ['''CREATE TABLE IF NOT EXISTS {0}.headlines(
+            id INTEGER PRIMARY KEY,
+            idSharesFK INTEGER,
+            ticker VARCHAR(5) NOT NULL,
+            headline VARCHAR(255) NOT NULL,
+            url VARCHAR(255),
+            source VARCHAR(25),
+            date INTEGER,
+            lookupdate INTEGER,
+            lastrepdate INTEGER)''',
+        '''CREATE UNIQUE INDEX IF NOT EXISTS {0}.headlines_ticker_headline
+            ON headlines(ticker, headline)''',
+        '''CREATE INDEX IF NOT EXISTS {0}.headlines_ticker_date
+            ON headlines(ticker, date)''',
+        # Each month has a full-text index of its own, as in hl.db, so that
+        #     search.py finds archived headlines too. Archived rows are only
+        #     ever added.
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS {0}.headlines_fts USING fts5(
+            ticker,
+            headline,
+            source,
+            content='headlines',
+            content_rowid='id',
+            tokenize='porter unicode61')''',
+        '''CREATE TRIGGER IF NOT EXISTS {0}.headlines_fts_insert
+            AFTER INSERT ON headlines
+        BEGIN
+            INSERT INTO headlines_fts(rowid, ticker, headline, source)
+                VALUES (new.id, new.ticker, new.headline, new.source);
+        END''']
+
+# Months archived, rows moved and free pages given back by one run.
+Summary = collections.namedtuple('Summary', ['months', 'moved', 'freed'])
+
+class Retention():
+    def __init__(self, root=ARCHIVE_DIR, hot_days=HOT_DAYS,
+            vacuum_pages=VACUUM_PAGES):
+        self.root = root
+        self.hot_days = hot_days
+        self.vacuum_pages = vacuum_pages
+        # Closed months, decompressed for reading, are kept here.
+        self.cache_dir = os.path.join(tempfile.gettempdir(),
+                'stockscrape_archive')
+
+    def cutoff(self, today=None):
+        """Out: earliest date (ISO 8601) kept in hl.db."""
+        return ((today or D.date.today()) -
+                D.timedelta(self.hot_days - 1)).isoformat()
+
+    def path(self, month):
+        return os.path.join(self.root, 'headlines-' + month + '.db')
+
+    def apply(self, connection, today=None):
+        """
+        In:  open connection to hl.db; optional date counted as today.
+        Out: Summary. Moves headlines dated before the cutoff to the
+                 archives, closes months wholly before it, and runs
+                 maintain(). Safe to run again after an interruption.
+        """
+        cutoff = self.cutoff(today)
+        months = [row[0] for row in connection.execute('''SELECT DISTINCT
+                substr(date, 1, 7) FROM headlines WHERE date < ?
+                ORDER BY 1''', (cutoff, ))]
+        moved = 0
+        with metrics.timer('retention', step='archive'):
+            for month in months:
+                moved += self.archive_month(connection, month, cutoff)
+        metrics.count('headlines_archived', moved)
+        return Summary(months, moved, self.maintain(connection))
+
+    def archive_month(self, connection, month, cutoff):
+        """
+        In:  open connection to hl.db; month (YYYY-MM); cutoff date.
+        Out: number of headlines of that month, dated before cutoff, moved
+                 from hl.db to the month's archive. A closed month is opened
+                 again, and compressed again, only if some of them are not
+                 in it yet.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(month)
+        start = month + '-01'
+        end = min(next_month(month) + '-01', cutoff)
+        closed = not os.path.exists(path) and os.path.exists(path + '.gz')
+        if closed and not self.unarchived(connection, month, start, end):
+            # All there already, e.g. after an interrupted run.
+            return self.remove_month(connection, start, end)
+        if closed:
+            # Opened again for late arrivals.
+            decompress(path + '.gz', path)
+            os.remove(path + '.gz')
+        connection.commit()
+        connection.execute('ATTACH DATABASE ? AS ' + SCHEMA, (path, ))
+        try:
+            create_month(connection, SCHEMA)
+            # A headline already archived is only deleted from hl.db, so an
+            #     interrupted run can be finished by running it again.
+            with connection:
+                connection.execute('''INSERT OR IGNORE INTO {0}.headlines
+                        SELECT {1} FROM main.headlines
+                        WHERE date >= ? AND date < ?'''.format(SCHEMA,
+                        COLUMNS), (start, end))
+                moved = self.remove_month(connection, start, end)
+        finally:
+            connection.execute('DETACH DATABASE ' + SCHEMA)
+        if next_month(month) + '-01' <= cutoff:
+            compress(path)
+        return moved
+
+    def unarchived(self, connection, month, start, end):
+        """
+        Out: number of headlines in hl.db dated from start to before end
+                 that month's archive does not have.
+        """
+        connection.commit()
+        connection.execute('ATTACH DATABASE ? AS ' + SCHEMA,
+                (self.readable(month), ))
+        try:
+            return connection.execute('''SELECT COUNT(*)
+                    FROM main.headlines AS h WHERE date >= ? AND date < ?
+                    AND NOT EXISTS (SELECT 1 FROM {0}.headlines AS a
+                        WHERE a.ticker = h.ticker
+                        AND a.headline = h.headline)'''.format(SCHEMA),
+                    (start, end)).fetchone()[0]
+        finally:
+            connection.execute('DETACH DATABASE ' + SCHEMA)
+
+    def remove_month(self, connection, start, end):
+        """
+        Out: number of headlines deleted from hl.db, dated from start to
+                 before end, once archived; their tickers are recorded in
+                 archived_tickers.
+        """
+        with connection:
+            connection.execute('''INSERT OR IGNORE INTO
+                    main.archived_tickers (ticker)
+                    SELECT DISTINCT ticker FROM main.headlines
+                    WHERE date >= ? AND date < ?''', (start, end))
+            return connection.execute('''DELETE FROM main.headlines
+                    WHERE date >= ? AND date < ?''', (start, end)).rowcount
+
+    def archived(self, connection, rows, today=None):
+        """
+        In:  open connection to hl.db; list of (ticker, headline, url,
+                 source, date, lookupdate) tuples, as for
+                 StockScraper.insert_headlines; optional date counted as
+                 today.
+        Out: set of the (ticker, headline) of those rows already in the
+                 archives. Only rows dated before the cutoff can be, so
+                 usually no archive is opened at all.
+        """
+        cutoff = self.cutoff(today)
+        old = [row for row in rows if row[4] and row[4] < cutoff]
+        if not old:
+            return set()
+        found = set()
+        for schema in self.sources(connection, min(row[4] for row in old),
+                max(row[4] for row in old)):
+            if schema == 'main':
+                continue
+            for row in old:
+                if connection.execute('''SELECT 1 FROM {0}.headlines
+                        WHERE ticker = ? AND headline = ?'''.format(schema),
+                        row[:2]).fetchone():
+                    found.add(tuple(row[:2]))
+        return found
+
+    def maintain(self, connection):
+        """
+        In:  open connection to hl.db.
+        Out: number of free pages given back to the file system. Refreshes
+                 the statistics the query planner uses, and merges some of
+                 the full-text index's segments.
+        """
+        connection.commit()
+        pages = connection.execute('PRAGMA page_count').fetchone()[0]
+        with metrics.timer('retention', step='maintain'):
+            with connection:
+                connection.execute('''INSERT INTO headlines_fts(headlines_fts,
+                        rank) VALUES ('merge', ?)''', (FTS_MERGE_PAGES, ))
+            connection.execute('PRAGMA analysis_limit = {0:d}'.format(
+                    ANALYSIS_LIMIT))
+            connection.execute('ANALYZE')
+            connection.commit()
+            # Last, so that pages the merge freed are given back as well.
+            if connection.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                # Only a full VACUUM switches an existing db over to
+                #     incremental vacuuming; needed once.
+                connection.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                connection.execute('VACUUM')
+            else:
+                # executescript steps the pragma to the end; execute frees
+                #     a single page.
+                connection.executescript(
+                        'PRAGMA incremental_vacuum{0};'.format(
+                        '' if self.vacuum_pages is None else
+                        '({0:d})'.format(self.vacuum_pages)))
+            # The merge and ANALYZE can add more pages than are freed.
+            freed = max(0, pages - connection.execute(
+                    'PRAGMA page_count').fetchone()[0])
+            # The file shrinks when the write-ahead log is written back.
+            connection.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+        return freed
+
+    def months(self):
+        """Out: sorted list of archived months (YYYY-MM)."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted({name[len('headlines-'):len('headlines-YYYY-MM')]
+                for name in os.listdir(self.root)
+                if name.startswith('headlines-') and
+                name.endswith(('.db', '.db.gz'))})
+
+    def readable(self, month):
+        """
+        Out: path of a database file of month's archive, for reading, with
+                 its full-text index.
+        """
+        path = self.path(month)
+        if os.path.exists(path):
+            index(path)
+            return path
+        # Decompressed once, and kept while the archive is unchanged.
+        stat = os.stat(path + '.gz')
+        cached = os.path.join(self.cache_dir, '{0}-{1}-{2}.db'.format(
+                os.path.basename(path)[:-3], stat.st_size, stat.st_mtime_ns))
+        if not os.path.exists(cached):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            decompress(path + '.gz', cached)
+        index(cached)
+        return cached
+
+    def sources(self, connection, first_date=None, last_date=None):
+        """
+        In:  open connection to hl.db; optional first and last dates (date
+                 objects or ISO 8601 strings) of the headlines wanted.
+        Out: generator of the names of the schemas holding them: 'main',
+                 then SCHEMA with each archived month in range attached in
+                 turn, for as long as the generator is not advanced. Commits
+                 first, since a database cannot be detached in a transaction.
+        """
+        connection.commit()
+        yield 'main'
+        first = str(first_date)[:7] if first_date is not None else ''
+        last = str(last_date)[:7] if last_date is not None else '9999-12'
+        for month in self.months():
+            if not first <= month <= last:
+                continue
+            connection.execute('ATTACH DATABASE ? AS ' + SCHEMA,
+                    (self.readable(month), ))
+            try:
+                yield SCHEMA
+            finally:
+                connection.execute('DETACH DATABASE ' + SCHEMA)
+
+def next_month(month):
+    """Out: month (YYYY-MM) after month."""
+    year, number = int(month[:4]), int(month[5:7])
+    if number == 12:
+        return '{0:04d}-01'.format(year + 1)
+    return '{0:04d}-{1:02d}'.format(year, number + 1)
+
+def create_month(connection, schema):
+    """
+    Create the tables of a month's archive in schema, if not there yet; a
+    full-text index added to an archive made without one is filled.
+    """
+    indexed = connection.execute('''SELECT 1 FROM {0}.sqlite_master
+            WHERE name = 'headlines_fts' '''.format(schema)).fetchone()
+    for statement in MONTH_SCHEMA:
+        connection.execute(statement.format(schema))
+    if not indexed:
+        connection.execute('''INSERT INTO {0}.headlines_fts(headlines_fts)
+                VALUES ('rebuild')'''.format(schema))
+
+def index(path):
+    """Give the month's archive at path its full-text index, if it lacks it."""
+    connection = SQ.connect(path)
+    try:
+        with connection:
+            create_month(connection, 'main')
+    finally:
+        connection.close()
+
+def compress(path):
+    """
+    Compact the database at path, gzip it and remove the original. The
+    gzip header holds no time, so the same rows give the same bytes.
+    """
+    connection = SQ.connect(path)
+    try:
+        connection.execute('VACUUM')
+    finally:
+        connection.close()
+    with open(path, 'rb') as source, open(path + '.gz.tmp', 'wb') as raw, \
+            gzip.GzipFile(os.path.basename(path), 'wb', fileobj=raw,
+            mtime=0) as f:
+        shutil.copyfileobj(source, f)
+    os.replace(path + '.gz.tmp', path + '.gz')
+    os.remove(path)
+
+def decompress(gz_path, path):
+    with gzip.open(gz_path, 'rb') as source, open(path + '.tmp', 'wb') as f:
+        shutil.copyfileobj(source, f)
+    os.replace(path + '.tmp', path)
+
+DEFAULT_RETENTION = Retention()
+
+def configure(root=ARCHIVE_DIR, hot_days=HOT_DAYS, vacuum_pages=VACUUM_PAGES):
+    """Replace the shared policy with one of the given settings."""
+    global DEFAULT_RETENTION
+    DEFAULT_RETENTION = Retention(root, hot_days, vacuum_pages)
+    return DEFAULT_RETENTION
+
+def apply(connection, today=None):
+    return DEFAULT_RETENTION.apply(connection, today)
+
+def sources(connection, first_date=None, last_date=None):
+    return DEFAULT_RETENTION.sources(connection, first_date, last_date)
+
+def archived(connection, rows, today=None):
+    return DEFAULT_RETENTION.archived(connection, rows, today)
+
+def main(args, db='hl.db'):
+    from headline_to_db import migrate_db
+    if args:
+        configure(hot_days=int(args[0]))
+    start = T.perf_counter()
+    with SQ.connect(db) as connection:
+        migrate_db(connection)
+        summary = apply(connection)
+    print('{0} headlines older than {1} moved to {2} month(s) of {3}; {4} '
+            'pages freed, in {5:.2f} s.'.format(summary.moved,
+            DEFAULT_RETENTION.cutoff(), len(summary.months),
+            DEFAULT_RETENTION.root, summary.freed, T.perf_counter() - start))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -6,6 +6,7 @@
 cd /home/dpb/github_public/stockscrape
 source /home/dpb/github_public/stockscrape/v_env3/bin/activate
 python /home/dpb/github_public/stockscrape/headline_to_db.py
+python /home/dpb/github_public/stockscrape/retention.py
 git add -A /home/dpb/github_public/stockscrape
 git commit -m 'upload downloads from today'
 
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# scheduler.py
+# 20261018
+
+"""
+Decide which tickers' headline pages to fetch on this run. Each ticker's
+refresh metadata (table refresh in hl.db) records when it was last fetched,
+when it last had a new headline, and its news velocity: new headlines per
+day, as a moving average. Active tickers are due again soon; dormant ones
+rarely; and no more than a given number are fetched in one run.
+"""
+
+import time as T
+
+DAY = 24 * 60 * 60
+# Aim to fetch a ticker about once per this many new headlines, well within
+#     the number Yahoo shows on one page, so that none are missed.
+HEADLINES_PER_FETCH = 4.0
+# Bounds on the time between fetches of one ticker, in seconds.
+MIN_INTERVAL = DAY / 4
+MAX_INTERVAL = 14 * DAY
+# Weight of the latest observation in the moving average of velocity.
+VELOCITY_WEIGHT = 0.5
+# Velocity assumed after the first fetch of a ticker whose page gave no
+#     rate: high enough to fetch it again after MIN_INTERVAL.
+INITIAL_VELOCITY = HEADLINES_PER_FETCH * DAY / MIN_INTERVAL
+
+def refresh_interval(velocity):
+    """
+    In:  news velocity (new headlines per day), or None if never fetched.
+    Out: seconds to wait between fetches.
+    """
+    if not velocity:
+        return MAX_INTERVAL
+    interval = HEADLINES_PER_FETCH / velocity * DAY
+    return min(MAX_INTERVAL, max(MIN_INTERVAL, interval))
+
+def due_symbols(connection, symbols, budget=None, now=None):
+    """
+    In:  open connection to hl.db, list of symbols, optional maximum number
+             of symbols to return, optional current time (seconds).
+    Out: list of symbols due for fetching, most overdue first. Symbols never
+             fetched come first of all.
+    """
+    if now is None:
+        now = T.time()
+    metadata = {row[0]: row[1:] for row in connection.execute(
+            '''SELECT ticker, last_fetch, news_velocity FROM refresh''')}
+    scored = []
+    for position, symbol in enumerate(symbols):
+        if symbol not in metadata or metadata[symbol][0] is None:
+            scored.append((float('inf'), -position, symbol))
+            continue
+        last_fetch, velocity = metadata[symbol]
+        overdue = (now - last_fetch) / refresh_interval(velocity)
+        if overdue >= 1:
+            scored.append((overdue, -position, symbol))
+    scored.sort(reverse=True)
+    if budget is not None:
+        scored = scored[:budget]
+    return [symbol for overdue, position, symbol in scored]
+
+def page_velocity(page, now):
+    """
+    In:  tuple of number of headlines on a page and time (seconds) of the
+             oldest, or None; current time (seconds).
+    Out: new headlines per day the page shows, or None if it shows none.
+    """
+    if not page or not page[0] or page[1] is None:
+        return None
+    return page[0] / (max(now - page[1], MIN_INTERVAL) / DAY)
+
+def record_fetches(connection, symbols, added_by_symbol, now=None,
+        pages=None):
+    """
+    In:  open connection to hl.db, list of symbols fetched on this run,
+             dictionary of symbol: number of new headlines,
+             optional current time (seconds), optional dictionary of
+             symbol: (number of headlines on its page, time of the oldest).
+    Out: Updates refresh for those symbols, in one transaction.
+    """
+    if now is None:
+        now = T.time()
+    previous = {}
+    cursor = connection.execute('''SELECT ticker, last_fetch,
+            last_new_headline, news_velocity FROM refresh''')
+    for row in cursor:
+        previous[row[0]] = row[1:]
+    rows = []
+    for symbol in symbols:
+        added = added_by_symbol.get(symbol, 0)
+        last_fetch, last_new, velocity = previous.get(symbol,
+                (None, None, None))
+        if last_fetch is None:
+            # First fetch: the page's headlines, over the days they go back,
+            #     give the rate; failing that, fetch again as soon as allowed
+            #     and let the rate decay from there.
+            velocity = page_velocity((pages or {}).get(symbol), now)
+            if velocity is None:
+                velocity = INITIAL_VELOCITY
+        else:
+            days = max(now - last_fetch, MIN_INTERVAL / 4) / DAY
+            observed = added / days
+            # Follow a rise at once, so that busy tickers lose nothing, but
+            #     let a fall show only gradually.
+            velocity = max(observed, VELOCITY_WEIGHT * observed +
+                    (1 - VELOCITY_WEIGHT) * (velocity or 0.0))
+        if added:
+            last_new = now
+        rows.append((symbol, now, last_new, velocity))
+    with connection:
+        connection.executemany('''INSERT OR REPLACE INTO refresh (ticker,
+                last_fetch, last_new_headline, news_velocity)
+                VALUES (?, ?, ?, ?)''', rows)
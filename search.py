@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# search.py
+# 20261018
+
+"""
+Full-text search of stored headlines and their sources, through the FTS5
+index headlines_fts, which triggers keep in step with the headlines table;
+headlines moved out of hl.db by retention.py are searched in the index of
+their month's archive.
+Queries are in FTS5 syntax: words (matched in any form, so 'cuts' finds
+'cut'), "quoted phrases", AND, OR, NOT, prefix* and source:word. Results
+are ranked best match first (bm25), or newest first with --by-date.
+
+    python search.py QUERY [--tickers A,B] [--days N] [--since YYYY-MM-DD]
+            [--until YYYY-MM-DD] [--by-date] [--limit N]
+    python search.py save NAME QUERY [--tickers A,B] [--days N]
+    python search.py saved
+    python search.py run NAME [--limit N]
+    python search.py forget NAME
+
+A saved search can be added to the report as a section of its own; see
+db_to_latex.process_searches.
+"""
+
+import collections
+import datetime as D
+import sqlite3 as SQ
+import sys
+from headline_to_db import migrate_db
+import metrics
+import retention
+
+DEFAULT_LIMIT = 50
+# Up to this many tickers are looked for in the index as well as in the
+#     headlines table, which is much faster when the words are common.
+INDEXED_TICKERS = 100
+
+Result = collections.namedtuple('Result', ['ticker', 'headline', 'source',
+        'date', 'url', 'score'])
+# A search saved by name; tickers is a list or None, days a number or None.
+SavedSearch = collections.namedtuple('SavedSearch', ['name', 'query',
+        'tickers', 'days'])
+
+def search(connection, query, tickers=None, first_date=None, last_date=None,
+        limit=DEFAULT_LIMIT, by_date=False):
+    """
+    In:  open connection to hl.db; query in FTS5 syntax; optional list of
+             tickers; optional first and last dates (date objects or ISO
+             8601 strings); largest number of results; whether to order
+             them newest first rather than best match first.
+    Out: list of Results, from hl.db and the archives in range. Raises
+             ValueError if the query is not valid.
+    """
+    # Words of the query are matched in headlines and sources only.
+    match = '{headline source} : (' + query + ')'
+    if tickers and len(tickers) <= INDEXED_TICKERS:
+        # As phrases, since 'BRK.B' is indexed as 'brk' followed by 'b'.
+        match += ' AND ticker : (' + ' OR '.join('"' +
+                ticker.replace('"', '""') + '"' for ticker in tickers) + ')'
+    conditions = ['headlines_fts MATCH ?']
+    parameters = [match]
+    if tickers:
+        # Exactly these tickers: the index stems them, as it does words.
+        conditions.append('h.ticker IN ({0})'.format(
+                ','.join('?' * len(tickers))))
+        parameters.extend(tickers)
+    if first_date is not None:
+        conditions.append('h.date >= ?')
+        parameters.append(str(first_date))
+    if last_date is not None:
+        conditions.append('h.date <= ?')
+        parameters.append(str(last_date))
+    order = 'h.date DESC, h.id DESC' if by_date else 'rank'
+    parameters.append(limit)
+    found = []
+    try:
+        with metrics.timer('search'):
+            # The best of each place, hl.db and the archived months in
+            #     range, then the best of those.
+            for schema in retention.sources(connection, first_date,
+                    last_date):
+                found.extend(connection.execute('''SELECT h.date, h.id,
+                        h.ticker, h.headline, h.source, h.date, h.url, rank
+                        FROM {0}.headlines_fts JOIN {0}.headlines AS h
+                            ON h.id = headlines_fts.rowid
+                        WHERE {1} ORDER BY {2} LIMIT ?'''.format(schema,
+                        ' AND '.join(conditions), order), parameters))
+    except SQ.OperationalError as e:
+        raise ValueError('Cannot search for {0!r}: {1}'.format(query, e))
+    if by_date:
+        found.sort(key=lambda row: (row[0] or '', row[1]), reverse=True)
+    else:
+        found.sort(key=lambda row: row[-1])
+    return [Result(*row[2:]) for row in found[:limit]]
+
+def save_search(connection, name, query, tickers=None, days=None):
+    """Save (or replace) a search under name, after checking the query."""
+    search(connection, query, limit=1)
+    with connection:
+        connection.execute('''INSERT OR REPLACE INTO searches (name, query,
+                tickers, days) VALUES (?, ?, ?, ?)''', (name, query,
+                ','.join(tickers) if tickers else None, days))
+
+def saved_searches(connection, names=None):
+    """
+    In:  open connection; optional list of names (default all).
+    Out: list of SavedSearches, in order of names or else by name.
+             Raises KeyError for a name not saved.
+    """
+    saved = collections.OrderedDict((row[0], SavedSearch(row[0], row[1],
+            row[2].split(',') if row[2] else None, row[3]))
+            for row in connection.execute('''SELECT name, query, tickers, days
+                FROM searches ORDER BY name'''))
+    if names is None:
+        return list(saved.values())
+    return [saved[name] for name in names]
+
+def forget_search(connection, name):
+    """Out: whether there was a search saved as name to forget."""
+    with connection:
+        return connection.execute('DELETE FROM searches WHERE name = ?',
+                (name, )).rowcount > 0
+
+def run_saved(connection, saved, today=None, limit=DEFAULT_LIMIT):
+    """
+    In:  open connection; SavedSearch; optional date counted as today;
+             largest number of results.
+    Out: list of Results, newest first, within saved.days of today if set.
+    """
+    first_date = None
+    if saved.days:
+        first_date = (today or D.date.today()) - D.timedelta(saved.days - 1)
+    return search(connection, saved.query, saved.tickers, first_date,
+            limit=limit, by_date=True)
+
+def print_results(results):
+    for result in results:
+        print('{0:10s} {1:6s} {2} ({3})'.format(result.date or '',
+                result.ticker, result.headline, result.source))
+    print('{0} headlines.'.format(len(results)))
+
+def option(args, name, default=None):
+    """Out: value following --name in args, or default."""
+    if name in args and args.index(name) + 1 < len(args):
+        return args[args.index(name) + 1]
+    return default
+
+def main(args, db='hl.db'):
+    # Values of options are not positional arguments.
+    positional = [arg for i, arg in enumerate(args) if not arg.startswith('--')
+            and not (i and args[i - 1] in ('--tickers', '--days', '--since',
+            '--until', '--limit'))]
+    tickers = option(args, '--tickers')
+    tickers = tickers.split(',') if tickers else None
+    days = option(args, '--days')
+    days = int(days) if days else None
+    limit = int(option(args, '--limit', DEFAULT_LIMIT))
+    with SQ.connect(db) as connection:
+        migrate_db(connection)
+        try:
+            if positional[:1] == ['save'] and len(positional) == 3:
+                save_search(connection, positional[1], positional[2], tickers,
+                        days)
+                print('Saved {0}.'.format(positional[1]))
+            elif positional == ['saved']:
+                for saved in saved_searches(connection):
+                    print('{0}: {1} (tickers: {2}; days: {3})'.format(
+                            saved.name, saved.query,
+                            ','.join(saved.tickers or ['all']),
+                            saved.days or 'all'))
+            elif positional[:1] == ['run'] and len(positional) == 2:
+                saved, = saved_searches(connection, positional[1:])
+                print_results(run_saved(connection, saved, limit=limit))
+            elif positional[:1] == ['forget'] and len(positional) == 2:
+                if not forget_search(connection, positional[1]):
+                    print('No search saved as {0}.'.format(positional[1]))
+            elif len(positional) == 1:
+                first_date = option(args, '--since')
+                if days:
+                    first_date = D.date.today() - D.timedelta(days - 1)
+                print_results(search(connection, positional[0], tickers,
+                        first_date, option(args, '--until'), limit,
+                        '--by-date' in args))
+            else:
+                print(__doc__)
+        except KeyError as e:
+            print('No search saved as {0}.'.format(e.args[0]))
+        except ValueError as e:
+            print(e)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# test_archive.py
+# 20261018
+
+"""
+archive.replay rebuilds the same db however the partitions' parsing is
+timed, and whatever order they are named in.
+
+Run from the main directory as
+    python -m pytest tests
+"""
+
+import contextlib
+import datetime as D
+import io
+import os
+import sqlite3 as SQ
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+import archive
+import fixtures
+
+DAYS = ['2015-03-10', '2015-03-11', '2015-03-12', '2015-03-13']
+
+class ReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, 'archive')
+        responses = archive.Archive(self.root)
+        symbols = fixtures.symbols(6)
+        for n, day in enumerate(DAYS):
+            date = D.date(*(int(part) for part in day.split('-')))
+            for symbol in symbols:
+                # Each page shows some of the headlines of the day before.
+                responses.store(archive.PAGE, symbol, 'url',
+                        fixtures.headline_page(symbol, headlines=10 + n,
+                        seed=symbol), date)
+            responses.store(archive.QUOTES, '+'.join(symbols), 'url',
+                    fixtures.quotes_csv(symbols, seed=n), date)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def replay(self, name, days=None, workers=None):
+        """Out: headline rows of the rebuilt db, ids and all, in id order."""
+        db = os.path.join(self.tmp.name, name)
+        with contextlib.redirect_stdout(io.StringIO()):
+            archive.replay(self.root, days, db, workers)
+        with SQ.connect(db) as connection:
+            return connection.execute('''SELECT id, ticker, headline,
+                    lookupdate FROM headlines ORDER BY id''').fetchall()
+
+    def test_replay_is_deterministic(self):
+        serial = self.replay('serial.db', workers=1)
+        self.assertEqual(self.replay('parallel.db', DAYS[::-1], 4), serial)
+        # Each day adds one headline per ticker; the rest keep the date
+        #     they were first seen, and ids follow the dates.
+        self.assertEqual(len(serial), 6 * (10 + len(DAYS) - 1))
+        self.assertEqual([row[3] for row in serial].count(DAYS[0]), 6 * 10)
+        self.assertEqual(serial, sorted(serial, key=lambda row: (row[3],
+                row[0])))
+
+    def test_replay_twice_adds_nothing(self):
+        self.replay('hl.db')
+        with SQ.connect(os.path.join(self.tmp.name, 'hl.db')) as connection:
+            counts = [connection.execute('SELECT COUNT(*) FROM ' + table
+                    ).fetchone()[0] for table in ('headlines', 'prices')]
+        self.assertEqual(counts[1], 6 * len(DAYS))
+        self.replay('hl.db')
+        with SQ.connect(os.path.join(self.tmp.name, 'hl.db')) as connection:
+            self.assertEqual([connection.execute('SELECT COUNT(*) FROM ' +
+                    table).fetchone()[0] for table in ('headlines', 'prices')],
+                    counts)
+
+    def test_percent_change_is_stored_as_computed(self):
+        self.replay('hl.db')
+        with SQ.connect(os.path.join(self.tmp.name, 'hl.db')) as connection:
+            prices = connection.execute('''SELECT lasttrade_value,
+                    chg_lastrep, pc_chg_lastrep FROM prices''').fetchall()
+        for last, change, percent in prices:
+            if last is None or change is None:
+                self.assertIsNone(percent)
+            elif last != change:
+                # Not rounded to the two decimals shown in the report.
+                self.assertEqual(percent, change * 100 / (last - change))
+
+    def test_migration_removes_repeated_prices(self):
+        path = os.path.join(self.tmp.name, 'old.db')
+        with SQ.connect(path) as connection:
+            # As made by an older create_table.sqlscript.
+            connection.execute('''CREATE TABLE shares(
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ticker VARCHAR(5) NOT NULL, owned INTEGER,
+                    UNIQUE (ticker))''')
+            connection.execute('''CREATE TABLE headlines(
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, idSharesFK INTEGER,
+                    ticker VARCHAR(5) NOT NULL, headline VARCHAR(255) NOT NULL,
+                    url VARCHAR(255), source VARCHAR(25), date INTEGER,
+                    lookupdate INTEGER, lastrepdate INTEGER)''')
+            connection.execute('''CREATE TABLE prices(
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, idSharesFK INTEGER,
+                    lookupdate INTEGER, lastrepdate INTEGER, chg_lastrep FLOAT,
+                    pc_chg_lastrep FLOAT, tradedate INTEGER,
+                    lasttrade_value FLOAT, div_per_shr FLOAT)''')
+            connection.executemany('''INSERT INTO prices (idSharesFK,
+                    lookupdate, tradedate) VALUES (?, ?, ?)''',
+                    [(1, DAYS[0], DAYS[0])] * 3 + [(1, DAYS[0], None)] * 2 +
+                    [(1, DAYS[1], DAYS[0]), (2, DAYS[0], DAYS[0])])
+        self.replay('old.db')
+        with SQ.connect(path) as connection:
+            self.assertEqual(connection.execute('''SELECT id FROM prices
+                    WHERE id <= 7 ORDER BY id''').fetchall(),
+                    [(1, ), (4, ), (6, ), (7, )])
+
+if __name__ == '__main__':
+    unittest.main()
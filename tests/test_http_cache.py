@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# test_http_cache.py
+# 20261018
+
+"""
+HTTPCache against the stand-in server: a rerun within the TTL is served
+from the cache, a stale entry is revalidated with its ETag or Last-Modified
+(304), and the least recently used entries are evicted past the size cap.
+
+Run from the main directory as
+    python -m pytest tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+import http_cache
+import fixtures
+
+class HTTPCacheTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = fixtures.StandInServer()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.close()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'http_cache.db')
+        self.requests = self.server.requests
+        self.not_modified = self.server.not_modified
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def url(self, symbol):
+        return self.server.news_url.format(symbol, '2015-03-13')
+
+    def test_rerun_is_served_from_cache(self):
+        cache = http_cache.HTTPCache(self.path)
+        body, downloaded = cache.fetch(self.url('S0001'), 'page')
+        self.assertTrue(downloaded)
+        self.assertEqual(body, fixtures.headline_page('S0001'))
+        cache.close()
+        # As on a second run the same day.
+        cache = http_cache.HTTPCache(self.path)
+        self.assertEqual(cache.fetch(self.url('S0001'), 'page'),
+                (body, False))
+        self.assertEqual(self.server.requests - self.requests, 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+        cache.close()
+
+    def test_stale_entry_is_revalidated(self):
+        cache = http_cache.HTTPCache(self.path, ttls={'page': 0})
+        body, _ = cache.fetch(self.url('S0002'), 'page')
+        self.assertEqual(cache.fetch(self.url('S0002'), 'page'),
+                (body, False))
+        self.assertEqual(self.server.requests - self.requests, 2)
+        self.assertEqual(self.server.not_modified - self.not_modified, 1)
+        self.assertEqual(cache.stats()['revalidated'], 1)
+        # Without an ETag, Last-Modified alone does as well.
+        with cache.connection:
+            cache.connection.execute('UPDATE responses SET etag = NULL')
+        self.assertEqual(cache.fetch(self.url('S0002'), 'page'),
+                (body, False))
+        self.assertEqual(self.server.not_modified - self.not_modified, 2)
+        cache.close()
+
+    def test_least_recently_used_are_evicted(self):
+        size = len(fixtures.headline_page('S0003'))
+        cache = http_cache.HTTPCache(self.path, max_bytes=int(size * 3.5))
+        for symbol in ['S0003', 'S0004', 'S0005']:
+            cache.fetch(self.url(symbol), 'page')
+        # S0003 is used again, so S0004 is now the least recently used.
+        cache.fetch(self.url('S0003'), 'page')
+        cache.fetch(self.url('S0006'), 'page')
+        cached = {row[0] for row in cache.connection.execute(
+                'SELECT url FROM responses')}
+        self.assertEqual(cached, {self.url(symbol)
+                for symbol in ['S0003', 'S0005', 'S0006']})
+        self.assertEqual(cache.stats()['evicted'], 1)
+        self.assertEqual(cache.connection.execute(
+                'SELECT COUNT(*) FROM bodies').fetchone()[0], 3)
+        self.assertEqual(cache.total, cache.connection.execute(
+                'SELECT SUM(size) FROM responses').fetchone()[0])
+        self.assertLessEqual(cache.total, cache.max_bytes)
+        cache.close()
+        self.assertEqual(http_cache.HTTPCache(self.path).total, sum(
+                len(fixtures.headline_page(symbol))
+                for symbol in ['S0003', 'S0005', 'S0006']))
+
+if __name__ == '__main__':
+    unittest.main()
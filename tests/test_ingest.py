@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# test_ingest.py
+# 20261018
+
+"""
+Headline ingest against the stand-in server: fetching pages concurrently,
+and parsing them in a pipeline or a pool of processes, stores exactly the
+rows the serial path does.
+
+Run from the main directory as
+    python -m pytest tests
+"""
+
+import contextlib
+import io
+import os
+import sqlite3 as SQ
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+import headline_to_db
+import fixtures
+
+TICKERS = 40
+
+class IngestTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = fixtures.StandInServer()
+        cls.symbols = fixtures.symbols(TICKERS)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.close()
+
+    def ingest(self, workers, parse_workers=0):
+        """Out: set of headline rows stored, without their ids."""
+        scraper = headline_to_db.StockScraper(False, None, workers,
+                parse_workers=parse_workers)
+        scraper.news_url = self.server.news_url
+        scraper.api_results = self.symbols
+        with tempfile.TemporaryDirectory() as tmp:
+            connection = SQ.connect(os.path.join(tmp, 'hl.db'))
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    scraper.process_news(connection)
+                rows = connection.execute('''SELECT ticker, headline, url,
+                        source, date, lookupdate FROM headlines''').fetchall()
+                fetched = connection.execute(
+                        'SELECT COUNT(*) FROM refresh').fetchone()[0]
+            finally:
+                connection.close()
+        self.assertEqual(fetched, TICKERS)
+        return set(rows)
+
+    def test_concurrent_matches_serial(self):
+        serial = self.ingest(1)
+        self.assertGreater(len(serial), TICKERS)
+        self.assertEqual(self.ingest(8), serial)
+
+    def test_parse_pool_matches_serial(self):
+        self.assertEqual(self.ingest(4, parse_workers=2), self.ingest(1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# test_latex_escape.py
+# 20261018
+
+"""
+escape_for_latex and escape_all against the replacements they stand in for,
+applied one after another as the report used to, on seeded random strings
+built mostly from the characters and sequences the replacements act on.
+
+Run from the main directory as
+    python -m pytest tests
+"""
+
+import collections as C
+import os
+import random
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from latex_escape import escape_for_latex, escape_all
+
+# The replacements, in the order in which they were originally applied one
+#     after another with str.replace. This table defines the output.
+REPLACEMENTS = C.OrderedDict([
+        ('&amp;', r'\&'),
+        ('&gt;', '>'),
+        ('&lt;', '<'),
+        ('&', r'\&'),
+        (r'\\&', r'\&'),
+        ('$', r'\$'),
+        ('%', r'\%'),
+        ('#', r'\#'),
+        (' "', ' ``'),
+        (" '", " `"),
+        ('"', "''"),
+        ('\xa0', ' ')])
+# Pieces random strings are made of: every key above, the characters they
+#     are made of, and some ordinary text.
+PIECES = (list(REPLACEMENTS) + list(set(''.join(REPLACEMENTS))) +
+        ['\\', ';', 'amp', 'gt', 'lt', 'a', 'Q3', ' ', 'é', '\x00'])
+CASES = 20000
+
+def escape_sequentially(a_string):
+    """Apply REPLACEMENTS one after another."""
+    for key in REPLACEMENTS:
+        a_string = a_string.replace(key, REPLACEMENTS[key])
+    return a_string
+
+def random_string(rng):
+    return ''.join(rng.choice(PIECES) for _ in range(rng.randint(0, 12)))
+
+class EscapeTest(unittest.TestCase):
+    def test_escape_for_latex(self):
+        rng = random.Random(0)
+        for _ in range(CASES):
+            a_string = random_string(rng)
+            self.assertEqual(escape_for_latex(a_string),
+                    escape_sequentially(a_string), repr(a_string))
+
+    def test_escape_all(self):
+        rng = random.Random(1)
+        for _ in range(CASES // 20):
+            strings = [random_string(rng) for _ in range(rng.randint(0, 8))]
+            self.assertEqual(escape_all(strings),
+                    [escape_sequentially(a_string) for a_string in strings],
+                    repr(strings))
+
+    def test_examples(self):
+        self.assertEqual(escape_for_latex('AT&amp;T up 5% on "record" Q3'),
+                r"AT\&T up 5\% on ``record'' Q3")
+        self.assertEqual(escape_for_latex('&amp;gt; \\& $1.2B #1'),
+                r'\> \& \$1.2B \#1')
+
+if __name__ == '__main__':
+    unittest.main()
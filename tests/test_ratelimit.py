@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# test_ratelimit.py
+# 20261018
+
+"""
+Retries with backoff, the circuit breaker and the daemon, against a fake
+clock and against the stand-in server failing requests on purpose.
+
+Run from the main directory as
+    python -m pytest tests
+"""
+
+import contextlib
+import io
+import os
+import random
+import sqlite3 as SQ
+import sys
+import tempfile
+import unittest
+import urllib.error as UE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+import headline_to_db
+import http_client
+import ratelimit
+import fixtures
+
+class Clock():
+    """Fake clock and sleep: sleeping only moves the clock on."""
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+def endpoint(clock, retries=3, threshold=5, reset_after=300.0):
+    return ratelimit.Endpoint('test', 1000.0, retries,
+            ratelimit.Backoff(1.0, 8.0, random.Random(0)),
+            ratelimit.CircuitBreaker(threshold, reset_after, clock),
+            clock.sleep)
+
+def failing(failures, error=None):
+    """Out: function failing failures times with error, then returning 'ok'."""
+    calls = []
+    def function():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error or UE.URLError('down')
+        return 'ok'
+    function.calls = calls
+    return function
+
+def http_error(code, retry_after=None):
+    headers = {'Retry-After': retry_after} if retry_after else {}
+    return UE.HTTPError('url', code, 'error', headers, None)
+
+class EndpointTest(unittest.TestCase):
+    def test_retries_with_backoff(self):
+        clock = Clock()
+        function = failing(3)
+        self.assertEqual(endpoint(clock).call(function), 'ok')
+        self.assertEqual(len(function.calls), 4)
+        self.assertEqual(len(clock.sleeps), 3)
+        # Full jitter: each delay is below its doubling nominal delay.
+        for attempt, wait in enumerate(clock.sleeps, 1):
+            self.assertLessEqual(wait, min(8.0, 2.0 ** (attempt - 1)))
+
+    def test_gives_up_after_retries(self):
+        clock = Clock()
+        function = failing(10, http_error(503))
+        with self.assertRaises(UE.HTTPError):
+            endpoint(clock, retries=2).call(function)
+        self.assertEqual(len(function.calls), 3)
+        self.assertEqual(len(clock.sleeps), 2)
+
+    def test_client_errors_are_not_retried(self):
+        clock = Clock()
+        function = failing(1, http_error(404))
+        with self.assertRaises(UE.HTTPError):
+            endpoint(clock).call(function)
+        self.assertEqual(len(function.calls), 1)
+
+    def test_retry_after_is_honoured(self):
+        clock = Clock()
+        endpoint(clock).call(failing(1, http_error(429, '30')))
+        self.assertEqual(clock.sleeps, [30.0])
+
+    def test_breaker_opens_half_opens_and_closes(self):
+        clock = Clock()
+        limited = endpoint(clock, retries=0, threshold=2, reset_after=60.0)
+        breaker = limited.breaker
+        for _ in range(2):
+            with self.assertRaises(UE.URLError):
+                limited.call(failing(1))
+        self.assertEqual(breaker.state, 'open')
+        # No request at all while open.
+        function = failing(0)
+        with self.assertRaises(ratelimit.CircuitOpen):
+            limited.call(function)
+        self.assertEqual(function.calls, [])
+        # After reset_after, one trial; its failure opens the circuit again.
+        clock.now += 60.0
+        with self.assertRaises(UE.URLError):
+            limited.call(failing(1))
+        self.assertEqual(breaker.state, 'open')
+        with self.assertRaises(ratelimit.CircuitOpen):
+            limited.call(function)
+        # The next trial, made half-open, succeeds and closes it.
+        clock.now += 60.0
+        states = []
+        self.assertEqual(limited.call(lambda: states.append(breaker.state)
+                or 'ok'), 'ok')
+        self.assertEqual(states, ['half-open'])
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_trial_answered_with_http_error_closes(self):
+        for code in (304, 404):
+            clock = Clock()
+            limited = endpoint(clock, retries=0, threshold=1, reset_after=60.0)
+            with self.assertRaises(UE.URLError):
+                limited.call(failing(1))
+            self.assertEqual(limited.breaker.state, 'open')
+            # The trial is answered, if not with a body: the endpoint works.
+            clock.now += 60.0
+            with self.assertRaises(UE.HTTPError):
+                limited.call(failing(1, http_error(code)))
+            self.assertEqual(limited.breaker.state, 'closed')
+            self.assertEqual(limited.call(failing(0)), 'ok')
+
+class StandInTest(unittest.TestCase):
+    def setUp(self):
+        self.server = fixtures.StandInServer(error_rate=0.3, seed=1)
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_retries_against_server(self):
+        self.server.error_rate = 0.0
+        self.server.fail_next = 2
+        clock = Clock()
+        response = endpoint(clock).call(http_client.urlopen,
+                self.server.quote_url.format('S0001', 's'))
+        self.assertEqual(response.read(), fixtures.quotes_csv(['S0001']))
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(len(clock.sleeps), 2)
+
+    def daemon(self, symbols, **options):
+        """
+        Out: output of run_daemon(**options) on symbols against the server;
+                 rows in refresh, prices and headlines; the scraper.
+        """
+        here = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                os.mkdir('data')
+                with open(os.path.join('data', 'list.txt'), 'w') as f:
+                    f.write('\n'.join(symbols))
+                scraper = headline_to_db.StockScraper(False, 'list.txt', 4)
+                scraper.news_url = self.server.news_url
+                scraper.quote_url = self.server.quote_url
+                # Enough retries, and a breaker slow enough to open, that
+                #     every request gets through a 30% error rate in the end.
+                scraper.endpoints = {kind: ratelimit.Endpoint(kind, 1000.0,
+                        8, ratelimit.Backoff(0.001, 0.01),
+                        ratelimit.CircuitBreaker(threshold=20))
+                        for kind in ('quotes', 'page')}
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    scraper.run_daemon(interval=0, **options)
+                with SQ.connect('hl.db') as connection:
+                    counts = [connection.execute('SELECT COUNT(*) FROM ' +
+                            table).fetchone()[0]
+                            for table in ('refresh', 'prices', 'headlines')]
+            finally:
+                os.chdir(here)
+        return output.getvalue(), counts, scraper
+
+    def test_daemon_cycles(self):
+        symbols = fixtures.symbols(30)
+        output, (fetched, prices, headlines), scraper = self.daemon(symbols,
+                cycles=3)
+        self.assertGreater(self.server.errors, 0)
+        self.assertIn('Cycle 3 done', output)
+        self.assertNotIn('failed', output)
+        # Every ticker's page was fetched in spite of the errors, and its
+        #     price stored once, however many cycles looked it up.
+        self.assertEqual(fetched, len(symbols))
+        self.assertEqual(prices, len(symbols))
+        self.assertGreater(headlines, len(symbols))
+        self.assertEqual({endpoint.breaker.state
+                for endpoint in scraper.endpoints.values()}, {'closed'})
+
+    def test_daemon_keeps_to_budget(self):
+        output, (fetched, prices, _), scraper = self.daemon(
+                fixtures.symbols(30), cycles=1, request_budget=10)
+        self.assertIn('10 of 30 tickers due', output)
+        self.assertEqual(fetched, 10)
+        self.assertEqual(prices, 30)
+        self.assertEqual(scraper.request_budget, 10)
+
+if __name__ == '__main__':
+    unittest.main()
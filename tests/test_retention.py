@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# test_retention.py
+# 20261018
+
+"""
+retention.Retention: a headline scraped again after it was archived is
+found in its month's archive and not stored as new, a closed month's
+archive is left byte for byte as it is unless headlines are added to it,
+archived headlines are still found by search.py, and maintain() never
+reports fewer than no pages freed.
+
+Run from the main directory as
+    python -m pytest tests
+"""
+
+import collections
+import datetime as D
+import os
+import sqlite3 as SQ
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import headline_to_db
+import retention
+import search
+
+TODAY = D.date(2026, 10, 18)
+JUNE = [('AA', 'June news {0}'.format(n), 'url', 'source',
+        '2026-06-{0:02d}'.format(n + 1), '2026-06-{0:02d}'.format(n + 1))
+        for n in range(20)]
+RECENT = [('AA', 'Recent news', 'url', 'source', '2026-10-10', '2026-10-10')]
+
+class RetentionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.scraper = headline_to_db.StockScraper(False, 'list.txt')
+        self.connection, self.policy = self.make_db('one')
+
+    def tearDown(self):
+        self.connection.close()
+        self.tmp.cleanup()
+
+    def make_db(self, name):
+        """Out: connection to a new hl.db with JUNE and RECENT; its policy."""
+        os.mkdir(os.path.join(self.tmp.name, name))
+        connection = SQ.connect(os.path.join(self.tmp.name, name, 'hl.db'))
+        headline_to_db.migrate_db(connection)
+        self.scraper.retention = retention.Retention(os.path.join(
+                self.tmp.name, name, 'hl_archive'), hot_days=30)
+        self.scraper.insert_headlines(connection, JUNE + RECENT)
+        return connection, self.scraper.retention
+
+    def archive(self, policy):
+        with open(policy.path('2026-06') + '.gz', 'rb') as f:
+            return f.read()
+
+    def test_archived_headline_is_not_new_again(self):
+        self.assertEqual(self.policy.apply(self.connection, TODAY).moved, 20)
+        added = collections.Counter()
+        self.assertEqual(self.scraper.insert_headlines(self.connection,
+                [JUNE[3]] + RECENT, added), 0)
+        self.assertEqual(added, {})
+        added = collections.Counter()
+        self.assertEqual(self.scraper.insert_headlines(self.connection,
+                [JUNE[3][:1] + ('Other June news', ) + JUNE[3][2:]], added), 1)
+        self.assertEqual(added, {'AA': 1})
+
+    def test_closed_month_is_left_alone(self):
+        summary = self.policy.apply(self.connection, TODAY)
+        self.assertGreaterEqual(summary.freed, 0)
+        compressed = self.archive(self.policy)
+        changed = os.stat(self.policy.path('2026-06') + '.gz').st_mtime_ns
+        # Nothing new for the month, as after a run interrupted between
+        #     archiving and deleting: not opened again.
+        with self.connection:
+            self.connection.execute('''INSERT INTO headlines (ticker,
+                    headline, url, source, date, lookupdate)
+                    VALUES (?, ?, ?, ?, ?, ?)''', JUNE[3])
+        self.assertEqual(self.policy.apply(self.connection, TODAY).moved, 1)
+        self.assertEqual(os.stat(self.policy.path('2026-06') + '.gz'
+                ).st_mtime_ns, changed)
+        self.assertEqual(os.listdir(self.policy.root),
+                ['headlines-2026-06.db.gz'])
+        # The same rows archived elsewhere, later, give the same bytes.
+        connection, policy = self.make_db('two')
+        policy.apply(connection, TODAY)
+        connection.close()
+        self.assertEqual(self.archive(policy), compressed)
+        self.scraper.retention = self.policy
+        # A late headline opens the month again.
+        self.scraper.insert_headlines(self.connection, [('AA', 'Late news',
+                'url', 'source', '2026-06-30', '2026-10-17')])
+        self.assertEqual(self.policy.apply(self.connection, TODAY).moved, 1)
+        self.assertNotEqual(self.archive(self.policy), compressed)
+        self.assertEqual(os.listdir(self.policy.root),
+                ['headlines-2026-06.db.gz'])
+
+    def test_archived_headlines_are_searched(self):
+        self.policy.apply(self.connection, TODAY)
+        shared = retention.DEFAULT_RETENTION
+        retention.DEFAULT_RETENTION = self.policy
+        try:
+            newest = search.search(self.connection, 'news', limit=3,
+                    by_date=True)
+            june = search.search(self.connection, 'june', limit=100)
+            dated = search.search(self.connection, 'news',
+                    first_date='2026-06-10', last_date='2026-06-12')
+        finally:
+            retention.DEFAULT_RETENTION = shared
+        self.assertEqual([result.headline for result in newest],
+                ['Recent news', 'June news 19', 'June news 18'])
+        self.assertEqual(len(june), 20)
+        self.assertEqual(sorted(result.date for result in dated),
+                ['2026-06-10', '2026-06-11', '2026-06-12'])
+
+    def test_freed_is_never_negative(self):
+        self.assertGreaterEqual(self.policy.maintain(self.connection), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# test_scheduler.py
+# 20261018
+
+"""
+scheduler.record_fetches: a ticker's first fetch sets its rate from what
+its page shows, so that a busy ticker is fetched again before its page
+fills up, and a dormant one is left alone.
+
+Run from the main directory as
+    python -m pytest tests
+"""
+
+import os
+import sqlite3 as SQ
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import scheduler
+
+DAY = scheduler.DAY
+NOW = 1000 * DAY
+
+class FirstFetchTest(unittest.TestCase):
+    def setUp(self):
+        self.connection = SQ.connect(':memory:')
+        self.connection.execute('''CREATE TABLE refresh(
+                ticker VARCHAR(5) PRIMARY KEY, last_fetch FLOAT,
+                last_new_headline FLOAT, news_velocity FLOAT)''')
+
+    def due(self, days_later):
+        return sorted(scheduler.due_symbols(self.connection, ['BUSY', 'QUIET',
+                'BLANK'], now=NOW + days_later * DAY))
+
+    def test_first_page_sets_rate(self):
+        # 20 headlines in two days; 20 headlines over 200 days; none.
+        scheduler.record_fetches(self.connection, ['BUSY', 'QUIET', 'BLANK'],
+                {'BUSY': 20, 'QUIET': 20}, NOW, {'BUSY': (20, NOW - 2 * DAY),
+                'QUIET': (20, NOW - 200 * DAY)})
+        self.assertEqual(self.due(0.1), [])
+        # Fetched again before the 20 headlines on its page are replaced.
+        self.assertEqual(self.due(0.5), ['BLANK', 'BUSY'])
+        self.assertNotIn('QUIET', self.due(13))
+        self.assertIn('QUIET', self.due(14))
+
+    def test_no_page_means_soon(self):
+        scheduler.record_fetches(self.connection, ['BUSY'], {'BUSY': 20},
+                NOW)
+        self.assertEqual(scheduler.due_symbols(self.connection, ['BUSY'],
+                now=NOW + scheduler.MIN_INTERVAL), ['BUSY'])
+
+if __name__ == '__main__':
+    unittest.main()
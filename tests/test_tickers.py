@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# test_tickers.py
+# 20261018
+
+"""
+tickers.sync marks a ticker that leaves the file inactive rather than
+deleting its shares row, so that its prices keep their share, and a ticker
+that returns gets its old id back.
+
+Run from the main directory as
+    python -m pytest tests
+"""
+
+import os
+import sqlite3 as SQ
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import tickers
+
+class SyncTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.connection = SQ.connect(os.path.join(self.tmp.name, 'hl.db'))
+        tickers.sync(self.connection, ['AA', 'BB', 'CC'])
+        self.ids = dict(self.connection.execute(
+                'SELECT ticker, id FROM shares'))
+        with self.connection:
+            self.connection.execute('''INSERT INTO prices (idSharesFK,
+                    lookupdate, tradedate) VALUES (?, '2026-10-16',
+                    '2026-10-16')''', (self.ids['BB'], ))
+
+    def tearDown(self):
+        self.connection.close()
+        self.tmp.cleanup()
+
+    def shares(self):
+        return self.connection.execute('''SELECT ticker, id, active
+                FROM shares ORDER BY id''').fetchall()
+
+    def test_removed_ticker_is_kept_inactive(self):
+        changes = tickers.sync(self.connection, ['AA', 'CC', 'DD'])
+        self.assertEqual(changes.deletes, ['BB'])
+        self.assertIn(('BB', self.ids['BB'], 0), self.shares())
+        # Its price still has a share to join to.
+        self.assertEqual(self.connection.execute('''SELECT ticker
+                FROM prices JOIN shares ON prices.idSharesFK = shares.id'''
+                ).fetchall(), [('BB', )])
+        # Nothing more to do while it stays out of the file.
+        self.assertFalse(any(tickers.sync(self.connection, ['AA', 'CC',
+                'DD'])))
+
+    def test_returning_ticker_gets_its_id_back(self):
+        tickers.sync(self.connection, ['AA', 'CC'])
+        changes = tickers.sync(self.connection, ['AA', 'BB', 'CC'])
+        self.assertEqual(changes.inserts, ['BB'])
+        self.assertEqual(self.shares(), [('AA', self.ids['AA'], 1),
+                ('BB', self.ids['BB'], 1), ('CC', self.ids['CC'], 1)])
+
+    def test_no_renaming_onto_inactive_ticker(self):
+        tickers.sync(self.connection, ['AA', 'CC'])
+        changes = tickers.sync(self.connection, ['AA', 'BB'], {'CC': 'BB'})
+        self.assertEqual(changes.renames, [])
+        self.assertEqual(self.shares(), [('AA', self.ids['AA'], 1),
+                ('BB', self.ids['BB'], 1), ('CC', self.ids['CC'], 0)])
+
+    def test_old_db_gains_active(self):
+        path = os.path.join(self.tmp.name, 'old.db')
+        with SQ.connect(path) as connection:
+            # As made by an older create_table.sqlscript.
+            connection.execute('''CREATE TABLE shares(
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ticker VARCHAR(5) NOT NULL, owned INTEGER,
+                    UNIQUE (ticker))''')
+            connection.execute('''CREATE TABLE headlines(
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, idSharesFK INTEGER,
+                    ticker VARCHAR(5) NOT NULL, headline VARCHAR(255) NOT NULL,
+                    url VARCHAR(255), source VARCHAR(25), date INTEGER,
+                    lookupdate INTEGER, lastrepdate INTEGER)''')
+            connection.execute('''CREATE TABLE prices(
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, idSharesFK INTEGER,
+                    lookupdate INTEGER, lastrepdate INTEGER, chg_lastrep FLOAT,
+                    pc_chg_lastrep FLOAT, tradedate INTEGER,
+                    lasttrade_value FLOAT, div_per_shr FLOAT)''')
+            connection.execute("INSERT INTO shares (ticker) VALUES ('XX')")
+        with SQ.connect(path) as connection:
+            tickers.sync(connection, ['YY'])
+            self.assertEqual(connection.execute('''SELECT ticker, active
+                    FROM shares ORDER BY id''').fetchall(), [('XX', 0),
+                    ('YY', 1)])
+        connection.close()
+
+if __name__ == '__main__':
+    unittest.main()
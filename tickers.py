@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# tickers.py
+# 20261018
+
+"""
+Bring the shares table of hl.db into line with a ticker file, by applying
+only the differences: tickers new to the file are inserted, those no longer
+in it marked inactive, and renamed ones updated in place. Nothing is
+deleted: an inactive ticker keeps its id, and so its prices, and gets them
+back if it returns to the file; a renamed ticker keeps its id too, and its
+headlines are moved to the new name.
+
+A ticker file has one ticker per line, as in data/; the INSERT statements of
+insert_all_tickers.sqlscript are read as well. A renames file has one
+renaming per line: old ticker, then new, separated by white space.
+
+    python tickers.py TICKER_FILE [RENAMES_FILE] [--dry-run]
+"""
+
+import collections
+import os
+import re
+import sqlite3 as SQ
+import sys
+import time as T
+from headline_to_db import migrate_db
+import metrics
+
+INSERT_RE = re.compile(r"^\s*INSERT\s+INTO\s+shares\s*\(ticker\)\s*VALUES\s*"
+        r"\(\s*'([^']*)'\s*\)", re.I)
+
+# Lists of tickers inserted (or made active again) and made inactive, and
+#     of (old, new) pairs renamed.
+Changes = collections.namedtuple('Changes', ['inserts', 'deletes',
+        'renames'])
+
+def find_file(filename):
+    """Out: filename, or the file of that name in data/ if there is one."""
+    if not os.path.exists(filename) and os.path.exists(
+            os.path.join('data', filename)):
+        return os.path.join('data', filename)
+    return filename
+
+def read_tickers(filename):
+    """
+    In:  name of a ticker file, or of insert_all_tickers.sqlscript.
+    Out: list of tickers, in file order, without blanks or repeats.
+    """
+    tickers = []
+    with open(find_file(filename), 'r') as f:
+        for line in f:
+            match = INSERT_RE.match(line)
+            if match:
+                tickers.append(match.group(1))
+                continue
+            line = line.strip()
+            if line and not line.startswith('--'):
+                tickers.append(line)
+    return list(collections.OrderedDict.fromkeys(tickers))
+
+def read_renames(filename):
+    """
+    In:  name of a renames file.
+    Out: dictionary of old ticker: new ticker.
+    """
+    renames = {}
+    with open(find_file(filename), 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 2:
+                renames[parts[0]] = parts[1]
+    return renames
+
+def diff(current, wanted, renames=None):
+    """
+    In:  active tickers now in shares; tickers wanted; optional dictionary
+             of old ticker: new ticker.
+    Out: Changes turning current into wanted. A renaming applies only if the
+             old ticker is there, the new one is not, and the new one is
+             wanted; otherwise the old is dropped and the new inserted.
+    """
+    current = set(current)
+    wanted_set = set(wanted)
+    renamed = []
+    moved_to = set()
+    for old, new in sorted((renames or {}).items()):
+        # Two old tickers renamed to the same new one: only the first is.
+        if (old in current and old not in wanted_set and new in wanted_set
+                and new not in current and new not in moved_to):
+            renamed.append((old, new))
+            moved_to.add(new)
+    moved_from = {old for old, new in renamed}
+    inserts = [ticker for ticker in wanted
+            if ticker not in current and ticker not in moved_to]
+    deletes = sorted(current - wanted_set - moved_from)
+    return Changes(inserts, deletes, renamed)
+
+def sync(connection, tickers, renames=None, dry_run=False):
+    """
+    In:  open connection to hl.db; list of tickers wanted; optional
+             dictionary of old ticker: new ticker; whether to leave the db
+             as it is.
+    Out: Changes, applied to shares in one transaction unless dry_run.
+             Tickers no longer wanted are made inactive, not deleted, so
+             that their prices keep their share; headlines and refresh
+             times of renamed ones follow the new name.
+    """
+    migrate_db(connection)
+    current = []
+    inactive = set()
+    for ticker, active in connection.execute(
+            'SELECT ticker, active FROM shares'):
+        if active:
+            current.append(ticker)
+        else:
+            inactive.add(ticker)
+    # A ticker made inactive before comes back under its own id, so it is
+    #     not renamed to.
+    renames = {old: new for old, new in (renames or {}).items()
+            if new not in inactive}
+    changes = diff(current, tickers, renames)
+    if dry_run or not any(changes):
+        return changes
+    with metrics.timer('db_sync', table='shares'), connection:
+        connection.executemany('UPDATE shares SET active = 0 WHERE ticker = ?',
+                [(ticker, ) for ticker in changes.deletes])
+        swapped = [(new, old) for old, new in changes.renames]
+        connection.executemany('UPDATE shares SET ticker = ? WHERE ticker = ?',
+                swapped)
+        # A headline the new ticker already has is left under the old one.
+        connection.executemany('''UPDATE OR IGNORE headlines SET ticker = ?
+                WHERE ticker = ?''', swapped)
+        connection.executemany('''UPDATE OR IGNORE refresh SET ticker = ?
+                WHERE ticker = ?''', swapped)
+        connection.executemany('''INSERT OR IGNORE INTO shares (ticker)
+                VALUES (?)''', [(ticker, ) for ticker in changes.inserts])
+        connection.executemany('UPDATE shares SET active = 1 WHERE ticker = ?',
+                [(ticker, ) for ticker in changes.inserts
+                if ticker in inactive])
+    return changes
+
+def main(args, db='hl.db'):
+    dry_run = '--dry-run' in args
+    args = [arg for arg in args if arg != '--dry-run']
+    if not 1 <= len(args) <= 2:
+        print(__doc__)
+        return
+    tickers = read_tickers(args[0])
+    renames = read_renames(args[1]) if len(args) == 2 else None
+    start = T.perf_counter()
+    with SQ.connect(db) as connection:
+        changes = sync(connection, tickers, renames, dry_run)
+    print('{0} tickers: {1} inserted, {2} made inactive, {3} renamed{4} '
+            'in {5:.3f} s.'.format(len(tickers), len(changes.inserts),
+            len(changes.deletes), len(changes.renames),
+            ' (dry run)' if dry_run else '', T.perf_counter() - start))
+    for old, new in changes.renames:
+        print('  {0} -> {1}'.format(old, new))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])